@@ -3,6 +3,33 @@ import sys
 import random
 import os
 import json
+import time
+import argparse
+import csv
+import mmap
+import struct
+import zlib
+import hashlib
+import gzip
+import glob
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import battle_solver
+except ImportError:
+    battle_solver = None
+
+if __name__ == "__main__" and ("--headless" in sys.argv or "--uncapped" in sys.argv):
+    os.environ["SDL_VIDEODRIVER"] = "dummy"
 
 pygame.init()
 
@@ -26,21 +53,13 @@ default_config = {
                 "name": "Princess Kenny", "image": "kenny.png", "portrait": "kenny_portrait.png",
                 "width": 150, "height": 150, "hp": 80, "default_position": [500, 400],
                 "battle_position": [550, 400], "placeholder_color": [200, 0, 0],
-                "dialogs": [
-                    {"text": "Mfhhfh !", "portrait": "kenny_portrait.png"},
-                    {"text": "Muhuhu Fuhhnh", "portrait": "kenny_portrait.png"},
-                    {"text": "Kenny please shut your mouth", "portrait": "stan_portrait.png"}
-                ]
+                "dialog": "Princess Kenny"
             },
             {
                 "name": "Kyle the Elf King", "image": "kyle.png", "portrait": "kyle_portrait.png",
                 "width": 150, "height": 150, "hp": 90, "default_position": [600, 350],
                 "battle_position": [550, 400], "placeholder_color": [0, 100, 200],
-                "dialogs": [
-                    {"text": "Behold the Elven King!", "portrait": "kyle_portrait.png"},
-                    {"text": "Hand over the Stick of Truth!", "portrait": "kyle_portrait.png"},
-                    {"text": "I'll never surrender it to you, Kyle!", "portrait": "stan_portrait.png"}
-                ]
+                "dialog": "Kyle the Elf King"
             }
         ],
         "npcs": [
@@ -48,11 +67,7 @@ default_config = {
                 "name": "Butters", "image": "butters.png", "portrait": "butters_portrait.png",
                 "width": 150, "height": 150, "default_position": [300, 350],
                 "placeholder_color": [200, 200, 0],
-                "dialogs": [
-                    {"text": "Oh hamburgers!", "portrait": "butters_portrait.png"},
-                    {"text": "Gee whiz, Stan!", "portrait": "butters_portrait.png"},
-                    {"text": "What's up, Butters?", "portrait": "stan_portrait.png"}
-                ]
+                "dialog": "Butters"
             }
         ]
     },
@@ -69,7 +84,49 @@ default_config = {
     "game": {
         "movement_speed": 5,
         "interaction_distance": 150,
-        "frame_rate": 60
+        "frame_rate": 60,
+        "tick_rate": 60,
+        "max_catch_up_ticks": 5,
+        "crowd": {"npc": "Butters", "count": 0},
+        "autosave_seconds": 5,
+        "autosave_file": "autosave.bin",
+        "quicksave_file": "quicksave.bin",
+        "dialog_corpus": "dialogs.corpus",
+        "language": "en"
+    },
+    "world": {
+        "chunk_width": 800,
+        "chunk_height": 600,
+        "stream_radius": 1,
+        "chunks": []
+    },
+    "performance": {
+        "asset_cache_mb": 64,
+        "text_cache_entries": 256,
+        "dirty_rects": False,
+        "profiler": True,
+        "profiler_frames": 600,
+        "loader_threads": 4,
+        "atlas": "assets.atlas",
+        "hot_reload": True,
+        "dialog_cache_entries": 32,
+        "adaptive_pacing": True,
+        "idle_after_seconds": 0.5,
+        "idle_frame_rate": 4,
+        "background_frame_rate": 20,
+        "render_scale": 1.0,
+        "dynamic_render_scale": False,
+        "min_render_scale": 0.5,
+        "smooth_upscale": False
+    },
+    "telemetry": {
+        "enabled": False,
+        "directory": "telemetry",
+        "format": "jsonl",
+        "buffer_kb": 1024,
+        "flush_seconds": 2.0,
+        "max_file_mb": 8,
+        "max_files": 20
     }
 }
 
@@ -84,6 +141,170 @@ def load_config():
 
 config = load_config()
 
+CHARACTER_KEYS = ("name", "image", "portrait", "width", "height", "default_position", "placeholder_color")
+ENEMY_KEYS = CHARACTER_KEYS + ("hp", "battle_position")
+
+def copy_slots(target, source):
+    for name in type(source).__slots__:
+        setattr(target, name, getattr(source, name))
+
+class DamageRange:
+    __slots__ = ("low", "high")
+    
+    def __init__(self, damage_config, where):
+        low, high = damage_config["min"], damage_config["max"]
+        if not isinstance(low, int) or not isinstance(high, int) or low < 0 or high < low:
+            raise ValueError(f"{where}: expected integers 0 <= min <= max, got {low}..{high}")
+        self.low, self.high = low, high
+    
+    def roll(self):
+        return random.randint(self.low, self.high)
+
+class BattleSettings:
+    __slots__ = ("actions", "player_move_damage", "enemy_move_damage", "heal_amount", "block_reduction")
+    
+    def __init__(self, battle_config):
+        self.actions = list(battle_config["actions"])
+        self.player_move_damage = {
+            name: DamageRange(damage, f"battle.player_move_damage.{name}")
+            for name, damage in battle_config["player_move_damage"].items()
+        }
+        for action in ("Attack", "Special"):
+            if action in self.actions and action not in self.player_move_damage:
+                raise ValueError(f"battle.player_move_damage: missing damage range for {action}")
+        self.enemy_move_damage = DamageRange(battle_config["enemy_move_damage"], "battle.enemy_move_damage")
+        self.heal_amount = int(battle_config["heal_amount"])
+        self.block_reduction = float(battle_config.get("block_reduction", 0.5))
+        if not 0 <= self.block_reduction <= 1:
+            raise ValueError(f"battle.block_reduction: expected a value in [0, 1], got {self.block_reduction}")
+
+class GameSettings:
+    __slots__ = ("movement_speed", "interaction_distance", "frame_rate", "tick_rate", "tick_length", "max_catch_up_ticks")
+    
+    def __init__(self, game_config):
+        self.movement_speed = game_config["movement_speed"]
+        self.interaction_distance = game_config["interaction_distance"]
+        self.frame_rate = game_config["frame_rate"]
+        self.tick_rate = game_config.get("tick_rate", 60)
+        self.max_catch_up_ticks = game_config.get("max_catch_up_ticks", 5)
+        if self.interaction_distance <= 0 or self.tick_rate <= 0 or self.max_catch_up_ticks < 1:
+            raise ValueError("game: interaction_distance, tick_rate and max_catch_up_ticks must be positive")
+        self.tick_length = 1.0 / self.tick_rate
+
+class WorldSettings:
+    __slots__ = ("chunk_width", "chunk_height", "stream_radius", "chunks")
+    
+    def __init__(self, world_config, window_config):
+        self.chunk_width = world_config.get("chunk_width", window_config["width"])
+        self.chunk_height = world_config.get("chunk_height", window_config["height"])
+        self.stream_radius = world_config.get("stream_radius", 1)
+        if self.chunk_width <= 0 or self.chunk_height <= 0 or self.stream_radius < 0:
+            raise ValueError("world: chunk sizes must be positive and stream_radius can't be negative")
+        self.chunks = list(world_config.get("chunks", []))
+        for chunk in self.chunks:
+            if len(chunk.get("position", ())) != 2:
+                raise ValueError("world.chunks: every chunk needs a [column, row] position")
+            for character in chunk.get("enemies", []):
+                check_keys(character, ENEMY_KEYS)
+            for character in chunk.get("npcs", []):
+                check_keys(character, CHARACTER_KEYS)
+    
+    def check_positions(self, characters):
+        # Same placement rule as ChunkWorld.assign, so a reload that would strand a character is
+        # refused before anything has been swapped in.
+        placed = [(character, 0, 0) for character in characters["enemies"] + characters["npcs"]]
+        positions = {(0, 0)}
+        for chunk in self.chunks:
+            column, row = chunk["position"]
+            positions.add((column, row))
+            for character in chunk.get("enemies", []) + chunk.get("npcs", []):
+                placed.append((character, column * self.chunk_width, row * self.chunk_height))
+        for character, offset_x, offset_y in placed:
+            x, y = character["default_position"]
+            x += offset_x + character["width"] / 2
+            y += offset_y + character["height"] / 2
+            if (int(x // self.chunk_width), int(y // self.chunk_height)) not in positions:
+                raise ValueError(f"{character['name']} is outside every world chunk")
+
+class Settings:
+    # Compiled once from the raw JSON; update() swaps values in place so
+    # everything holding a reference sees hot-reloaded values.
+    __slots__ = ("game", "battle", "world")
+    
+    def __init__(self, raw_config):
+        characters = raw_config["characters"]
+        for character in [characters["player"]] + characters["enemies"]:
+            check_keys(character, ENEMY_KEYS)
+        for character in characters["npcs"]:
+            check_keys(character, CHARACTER_KEYS)
+        self.game = GameSettings(raw_config["game"])
+        if raw_config.get("performance", {}).get("dynamic_render_scale") and self.game.frame_rate <= 0:
+            raise ValueError("performance.dynamic_render_scale needs a frame_rate cap to budget against")
+        self.battle = BattleSettings(raw_config["battle"])
+        self.world = WorldSettings(raw_config.get("world", {}), raw_config["window"])
+        self.world.check_positions(characters)
+    
+    def update(self, raw_config):
+        compiled = Settings(raw_config)
+        copy_slots(self.game, compiled.game)
+        copy_slots(self.battle, compiled.battle)
+        copy_slots(self.world, compiled.world)
+
+def check_keys(character_config, keys):
+    missing = [key for key in keys if key not in character_config]
+    if missing:
+        raise ValueError(f"{character_config.get('name', 'character')}: missing {', '.join(missing)}")
+
+settings = Settings(config)
+
+def read_config(path):
+    # For the command-line tools: another config file, validated exactly as the game would.
+    with open(path, 'r') as f:
+        raw_config = json.load(f)
+    Settings(raw_config)
+    return raw_config
+
+class ConfigWatcher:
+    def __init__(self, path, dialog_dir=None, interval=0.5):
+        self.path = path
+        self.dialog_dir = dialog_dir
+        self.interval = interval
+        self.mtime = self.modified_time()
+        self.next_check = 0.0
+    
+    def modified_time(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return None
+        # Editing a dialog source reloads the config too, which rebuilds the corpus.
+        return (mtime, dialog_sources_modified(self.dialog_dir)) if self.dialog_dir else mtime
+    
+    def poll(self):
+        now = time.perf_counter()
+        if now < self.next_check:
+            return None
+        self.next_check = now + self.interval
+        
+        mtime = self.modified_time()
+        if mtime is None or mtime == self.mtime:
+            return None
+        try:
+            with open(self.path, 'r') as f:
+                new_config = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            # Probably caught the editor mid-write; try again on the next poll.
+            return None
+        self.mtime = mtime
+        return new_config
+
+def reload_config(new_config):
+    global player_config
+    settings.update(new_config)
+    config.clear()
+    config.update(new_config)
+    player_config = config["characters"]["player"]
+
 WIDTH = config["window"]["width"]
 HEIGHT = config["window"]["height"]
 WHITE = tuple(config["colors"]["white"])
@@ -93,6 +314,8 @@ GREEN = tuple(config["colors"]["green"])
 BLUE = tuple(config["colors"]["blue"])
 DIALOG_BG = tuple(config["colors"]["dialog_bg"])
 BATTLE_BG = tuple(config["colors"]["battle_bg"])
+PERFORMANCE = config.get("performance", {})
+TELEMETRY = config.get("telemetry", {})
 
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
 pygame.display.set_caption(config["window"]["title"])
@@ -101,30 +324,620 @@ small_font = pygame.font.SysFont(None, 24)
 
 os.makedirs('images', exist_ok=True)
 
+class FrameProfiler:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.samples = {}
+        self.current = {}
+        self.frames = 0
+        self.frame_start = 0.0
+        self.phase_name = None
+        self.phase_start = 0.0
+        self.show_overlay = False
+        self.overlay = None
+        self.overlay_age = 0
+        self.overlay_status = None
+    
+    def begin_frame(self):
+        self.current = {}
+        self.frame_start = time.perf_counter()
+    
+    def phase(self, name):
+        # Ends the running phase and starts the next one; None just closes it.
+        now = time.perf_counter()
+        if self.phase_name is not None:
+            self.add(self.phase_name, now - self.phase_start)
+        self.phase_name = name
+        self.phase_start = now
+    
+    def add(self, name, seconds):
+        self.current[name] = self.current.get(name, 0.0) + seconds
+    
+    def end_frame(self):
+        self.phase(None)
+        self.add("frame", time.perf_counter() - self.frame_start)
+        slot = self.frames % self.capacity
+        for name in self.current:
+            if name not in self.samples:
+                self.samples[name] = array('d', bytes(8 * self.capacity))
+        for name, ring in self.samples.items():
+            ring[slot] = self.current.get(name, 0.0)
+        self.frames += 1
+    
+    def recorded(self, name):
+        ring = self.samples.get(name)
+        if ring is None:
+            return []
+        if self.frames < self.capacity:
+            return list(ring[:self.frames])
+        slot = self.frames % self.capacity
+        return list(ring[slot:]) + list(ring[:slot])
+    
+    def percentile(self, name, percent):
+        values = sorted(self.recorded(name))
+        if not values:
+            return 0.0
+        return values[min(len(values) - 1, int(len(values) * percent / 100))]
+    
+    def summary(self):
+        result = {}
+        for name in self.samples:
+            values = self.recorded(name)
+            result[name] = {
+                "mean_ms": sum(values) / len(values) * 1000 if values else 0.0,
+                "p50_ms": self.percentile(name, 50) * 1000,
+                "p99_ms": self.percentile(name, 99) * 1000,
+            }
+        return result
+    
+    def toggle_overlay(self):
+        self.show_overlay = not self.show_overlay
+        self.overlay = None
+    
+    def draw_overlay(self, surface, status=None):
+        if not self.show_overlay:
+            return
+        # Rebuilding the text every frame would dominate what we are measuring.
+        if self.overlay is None or self.overlay_age >= 30 or status != self.overlay_status:
+            self.overlay_status = status
+            lines = [f"frame p50 {self.percentile('frame', 50) * 1000:.2f} ms  p99 {self.percentile('frame', 99) * 1000:.2f} ms"]
+            if status is not None:
+                lines.insert(0, status)
+            for name in sorted(self.samples):
+                if name != "frame":
+                    lines.append(f"{name}: p50 {self.percentile(name, 50) * 1000:.2f}  p99 {self.percentile(name, 99) * 1000:.2f}")
+            lines += overlay_counters()
+            rendered = [small_font.render(line, True, (255, 255, 0)) for line in lines]
+            self.overlay = pygame.Surface((max(text.get_width() for text in rendered) + 10, 18 * len(rendered) + 10))
+            self.overlay.fill((0, 0, 0))
+            for i, text in enumerate(rendered):
+                self.overlay.blit(text, (5, 5 + i * 18))
+            self.overlay_age = 0
+        self.overlay_age += 1
+        mark_dirty(surface.blit(self.overlay, (10, HEIGHT - self.overlay.get_height() - 10)), self.overlay)
+    
+    def export(self, path):
+        names = sorted(self.samples)
+        if path.endswith(".csv"):
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(["frame"] + [f"{name}_ms" for name in names])
+                columns = [self.recorded(name) for name in names]
+                for i, row in enumerate(zip(*columns)):
+                    writer.writerow([i] + [f"{value * 1000:.4f}" for value in row])
+        else:
+            with open(path, 'w') as f:
+                json.dump({
+                    "frames": self.frames,
+                    "summary": self.summary(),
+                    "samples_ms": {name: [value * 1000 for value in self.recorded(name)] for name in names},
+                }, f, indent=4)
+
+profiler = FrameProfiler(PERFORMANCE.get("profiler_frames", 600)) if PERFORMANCE.get("profiler", True) else None
+
+def profiled(name):
+    def decorate(func):
+        def wrapper(*args, **kwargs):
+            if profiler is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profiler.add(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
 def create_placeholder_image(width, height, color):
     surface = pygame.Surface((width, height))
     surface.fill(color)
     return surface
 
-def get_image(filename, width, height, color):
+def load_image(filename, width, height, color):
     filepath = os.path.join('images', filename)
     try:
         if os.path.exists(filepath):
             img = pygame.image.load(filepath)
-            return pygame.transform.scale(img, (width, height))
+            return pygame.transform.scale(img, (width, height)), True
     except pygame.error:
         pass
-    return create_placeholder_image(width, height, color)
+    return create_placeholder_image(width, height, color), False
+
+def to_display_format(surface):
+    if pygame.display.get_surface() is None:
+        return surface
+    if surface.get_flags() & pygame.SRCALPHA:
+        return surface.convert_alpha()
+    return surface.convert()
+
+ATLAS_MAGIC = b"SOTATLAS"
+ATLAS_VERSION = 1
+ATLAS_HEADER = struct.Struct("<8sII")
+
+class AtlasBundle:
+    # Layout: magic, version, header length, JSON header, padding to 16 bytes,
+    # then width * height RGBA pixels. Entries are keyed by (filename, width, height, angle).
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_length = ATLAS_HEADER.unpack_from(self.buffer, 0)
+        if magic != ATLAS_MAGIC or version != ATLAS_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {ATLAS_VERSION} atlas bundle")
+        
+        start = ATLAS_HEADER.size
+        header = json.loads(self.buffer[start:start + header_length].decode("utf-8"))
+        pixels_offset = (start + header_length + 15) // 16 * 16
+        size = (header["width"], header["height"])
+        pixels = memoryview(self.buffer)[pixels_offset:pixels_offset + size[0] * size[1] * 4]
+        self.surface = pygame.image.frombuffer(pixels, size, "RGBA")
+        if pygame.display.get_surface() is not None:
+            # One conversion for the whole sheet keeps blits in the display format.
+            self.surface = self.surface.convert_alpha()
+        
+        self.rects = {}
+        self.opaque = set()
+        for entry in header["entries"]:
+            source = os.path.join('images', entry["key"][0])
+            # Entries whose source image changed after the bundle was built are ignored.
+            if os.path.exists(source) and os.path.getmtime(source) > entry["mtime"]:
+                continue
+            self.rects[tuple(entry["key"])] = pygame.Rect(entry["rect"])
+            if entry.get("opaque"):
+                self.opaque.add(tuple(entry["key"]))
+    
+    def get(self, filename, width, height, angle=0):
+        rect = self.rects.get((filename, width, height, angle))
+        if rect is None:
+            return None
+        surface = self.surface.subsurface(rect)
+        if (filename, width, height, angle) in self.opaque and pygame.display.get_surface() is not None:
+            # Backgrounds are copied out of the sheet: per-pixel alpha would make their blits ~4x slower.
+            surface = surface.convert()
+        return surface
+    
+    def __contains__(self, key):
+        return key in self.rects
+    
+    def close(self):
+        self.buffer.close()
+        self.file.close()
+
+def open_atlas(path):
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        return AtlasBundle(path)
+    except (ValueError, struct.error, KeyError, pygame.error) as error:
+        print(f"Ignoring atlas bundle {path}: {error}")
+        return None
+
+class AssetCache:
+    def __init__(self, budget_mb):
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.surfaces = OrderedDict()
+        self.sizes = {}
+        self.missing = set()
+        self.pending = {}
+        self.atlas = None
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def key(self, filename, width, height, color):
+        # Placeholders depend on the caller's color, real images only on the file.
+        if filename in self.missing:
+            return (filename, width, height, tuple(color))
+        return (filename, width, height)
+    
+    def get(self, filename, width, height, color):
+        key = self.key(filename, width, height, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+        
+        self.misses += 1
+        if self.atlas is not None:
+            surface = self.atlas.get(filename, width, height)
+            if surface is not None:
+                self.store(key, surface)
+                return surface
+        
+        future = self.pending.pop((filename, width, height), None)
+        if future is not None:
+            surface, loaded = future.result()
+        else:
+            surface, loaded = load_image(filename, width, height, color)
+        if not loaded:
+            self.missing.add(filename)
+            key = self.key(filename, width, height, color)
+            surface = create_placeholder_image(width, height, color)
+        surface = to_display_format(surface)
+        self.store(key, surface)
+        return surface
+    
+    def get_rotated(self, filename, width, height, color, angle):
+        base = self.get(filename, width, height, color)
+        if angle == 0:
+            return base
+        key = self.key(filename, width, height, color) + ("rotated", angle)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+        
+        self.misses += 1
+        surface = self.atlas.get(filename, width, height, angle) if self.atlas is not None else None
+        if surface is None:
+            surface = pygame.transform.rotate(base, angle)
+        self.store(key, surface)
+        return surface
+    
+    def ready(self, filename, width, height, color):
+        # True when get() can answer without waiting on a worker thread or the disk.
+        if self.key(filename, width, height, color) in self.surfaces:
+            return True
+        if self.atlas is not None and (filename, width, height, 0) in self.atlas:
+            return True
+        future = self.pending.get((filename, width, height))
+        return future is not None and future.done()
+    
+    def discard(self, filename, width, height, color):
+        key = self.key(filename, width, height, color)
+        if key in self.surfaces:
+            del self.surfaces[key]
+            self.used -= self.sizes.pop(key)
+        future = self.pending.pop((filename, width, height), None)
+        if future is not None:
+            future.cancel()
+    
+    def store(self, key, surface):
+        size = surface.get_bytesize() * surface.get_width() * surface.get_height()
+        if size > self.budget:
+            return
+        if key in self.surfaces:
+            self.used -= self.sizes[key]
+        self.surfaces[key] = surface
+        self.surfaces.move_to_end(key)
+        self.sizes[key] = size
+        self.used += size
+        while self.used > self.budget:
+            old_key, _ = self.surfaces.popitem(last=False)
+            self.used -= self.sizes.pop(old_key)
+            self.evictions += 1
+    
+    def stats(self):
+        return {
+            "entries": len(self.surfaces),
+            "used_bytes": self.used,
+            "budget_bytes": self.budget,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+assets = AssetCache(PERFORMANCE.get("asset_cache_mb", 64))
+
+class AssetLoader:
+    # Decoding and scaling run on worker threads; conversion to the display
+    # format and cache insertion stay on the main thread inside AssetCache.get.
+    def __init__(self, cache, workers):
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="asset-loader")
+    
+    def preload(self, entries):
+        futures = []
+        for filename, width, height, color in entries:
+            key = (filename, width, height)
+            if self.cache.key(filename, width, height, color) in self.cache.surfaces:
+                continue
+            if self.cache.atlas is not None and key + (0,) in self.cache.atlas:
+                continue
+            if key not in self.cache.pending:
+                self.cache.pending[key] = self.executor.submit(load_image, filename, width, height, color)
+            futures.append(self.cache.pending[key])
+        return futures
+    
+    def load(self, entries, progress=None):
+        entries = list(entries)
+        futures = self.preload(entries)
+        total = len(futures)
+        if progress is not None:
+            progress(0, total)
+        for done, _ in enumerate(as_completed(futures), 1):
+            if progress is not None:
+                progress(done, total)
+        for entry in entries:
+            self.cache.get(*entry)
+    
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+assets.atlas = open_atlas(PERFORMANCE.get("atlas", "assets.atlas"))
+asset_loader = AssetLoader(assets, PERFORMANCE.get("loader_threads", 4))
+
+def get_image(filename, width, height, color):
+    return assets.get(filename, width, height, color)
+
+def scaled_asset(asset, scale):
+    if scale == 1.0:
+        return asset
+    filename, width, height, color = asset
+    return (filename, round(width * scale), round(height * scale), color)
+
+def get_rotated_image(filename, width, height, color, angle):
+    return assets.get_rotated(filename, width, height, color, angle)
+
+class TextCache:
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    @profiled("text_render")
+    def render(self, text_font, text, color):
+        key = (text_font, text, color)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+        
+        self.misses += 1
+        surface = text_font.render(text, True, color)
+        self.surfaces[key] = surface
+        if len(self.surfaces) > self.max_entries:
+            self.surfaces.popitem(last=False)
+        return surface
+    
+    def stats(self):
+        return {"entries": len(self.surfaces), "hits": self.hits, "misses": self.misses}
+
+text_cache = TextCache(PERFORMANCE.get("text_cache_entries", 256))
+
+def render_text(text_font, text, color):
+    return text_cache.render(text_font, text, color)
+
+class LayerCache:
+    # Pre-composited surfaces, rebuilt only when one of their inputs changes.
+    def __init__(self):
+        self.layers = {}
+    
+    def get(self, name, inputs, build):
+        layer = self.layers.get(name)
+        if layer is None or layer[0] != inputs:
+            layer = (inputs, build(*inputs))
+            self.layers[name] = layer
+        return layer[1]
+
+layer_cache = LayerCache()
+
+class Widget:
+    # Retained UI element: keeps its composed surface and rebuilds it only when a bound value changes,
+    # so a frame where nothing changed costs one blit.
+    def __init__(self, build, anchor="topleft"):
+        self.build = build
+        self.anchor = anchor
+        self.bound = None
+        self.surface = None
+    
+    def draw(self, surface, position, *bound):
+        if self.surface is None or bound != self.bound:
+            self.bound = bound
+            self.surface = self.build(*bound)
+        drawn = surface.blit(self.surface, self.surface.get_rect(**{self.anchor: position}))
+        mark_dirty(drawn, self.surface)
+        return drawn
+
+def merge_rects(rects):
+    merged = []
+    for rect in rects:
+        rect = pygame.Rect(rect)
+        i = 0
+        while i < len(merged):
+            if rect.colliderect(merged[i]):
+                rect.union_ip(merged.pop(i))
+                i = 0
+            else:
+                i += 1
+        merged.append(rect)
+    return merged
+
+class DirtyRectRenderer:
+    def __init__(self, width, height):
+        self.screen_rect = pygame.Rect(0, 0, width, height)
+        self.background = None
+        self.previous = []
+        self.current = []
+        self.full_redraw = True
+        self.dirty_rects = []
+        self.dirty_area = 0
+    
+    def begin(self, surface, background):
+        if background is not self.background:
+            self.background = background
+            self.full_redraw = True
+        
+        if self.full_redraw:
+            surface.blit(background, (0, 0))
+        else:
+            for rect, _ in self.previous:
+                surface.blit(background, rect, rect)
+    
+    def mark(self, rect, key=None):
+        rect = self.screen_rect.clip(rect)
+        if rect.width and rect.height:
+            self.current.append((rect, key))
+    
+    def invalidate(self):
+        # Also forces the next begin() to repaint everything, whatever was drawn in between.
+        self.background = None
+        self.full_redraw = True
+    
+    def present(self):
+        if self.full_redraw:
+            pygame.display.flip()
+            self.dirty_rects = [self.screen_rect]
+        elif self.current == self.previous:
+            # Same elements with the same content at the same places: nothing to push.
+            self.dirty_rects = []
+        else:
+            self.dirty_rects = merge_rects([rect for rect, _ in self.previous + self.current])
+            pygame.display.update(self.dirty_rects)
+        
+        self.dirty_area = sum(rect.width * rect.height for rect in self.dirty_rects)
+        self.previous, self.current = self.current, []
+        self.full_redraw = False
+        return self.dirty_area
+
+dirty_renderer = DirtyRectRenderer(WIDTH, HEIGHT) if PERFORMANCE.get("dirty_rects", False) else None
+
+def mark_dirty(rect, key=None):
+    if dirty_renderer is not None:
+        dirty_renderer.mark(rect, key)
+
+def overlay_counters():
+    # Sampled when the profiler overlay rebuilds, so they lag by up to its refresh interval.
+    cache = assets.stats()
+    lines = [f"assets: {cache['entries']} cached, {cache['used_bytes'] / 2 ** 20:.1f} of {cache['budget_bytes'] / 2 ** 20:.0f} MiB, "
+             f"{cache['hits']} hits  {cache['misses']} misses  {cache['evictions']} evicted"]
+    text = text_cache.stats()
+    lines.append(f"text: {text['entries']} cached, {text['hits']} hits  {text['misses']} misses")
+    if dialog_corpus is not None:
+        dialogs = dialog_corpus.stats()
+        lines.append(f"dialogs: {dialogs['cached']} of {dialogs['conversations']} parsed, "
+                     f"{dialogs['hits']} hits  {dialogs['misses']} misses")
+    if dirty_renderer is not None:
+        lines.append(f"dirty: {dirty_renderer.dirty_area * 100 / (WIDTH * HEIGHT):.1f}% of the screen pushed")
+    if telemetry is not None:
+        stats = telemetry.stats()
+        lines.append(f"telemetry: {stats['buffered']} of {stats['capacity']} buffered  {stats['dropped']} dropped")
+    return lines
+
+RENDER_SCALE_STEP = 0.125
+RENDER_SCALE_WINDOW = 60
+
+def quantize_scale(scale):
+    # Eighths keep chunk and sprite sizes whole numbers of pixels for the usual sizes.
+    return min(1.0, max(RENDER_SCALE_STEP, round(scale / RENDER_SCALE_STEP) * RENDER_SCALE_STEP))
+
+class RenderScaler:
+    # Below scale 1 the scene (background and sprites) is drawn to a smaller surface with assets pre-scaled
+    # to match, then upscaled to the window once per frame; the UI is still drawn at full resolution on top.
+    # With dynamic scaling the scale steps between min_scale and max_scale to keep frames within budget.
+    def __init__(self, scale, dynamic=False, min_scale=0.5, smooth=False):
+        self.max_scale = quantize_scale(scale)
+        self.min_scale = min(quantize_scale(min_scale), self.max_scale)
+        self.scale = self.max_scale
+        self.dynamic = dynamic
+        self.smooth = smooth
+        self.surface = None
+        self.frame_times = deque(maxlen=RENDER_SCALE_WINDOW)
+    
+    def preload(self):
+        if self.scale != 1.0:
+            manifest = asset_manifest(config)
+            asset_loader.preload([scaled_asset(asset, self.scale) for group in ("explore", "battle") for asset in manifest[group]])
+    
+    def set_scale(self, scale):
+        self.scale = scale
+        self.frame_times.clear()
+        self.preload()
+    
+    def begin(self):
+        size = (round(WIDTH * self.scale), round(HEIGHT * self.scale))
+        if self.surface is None or self.surface.get_size() != size:
+            self.surface = to_display_format(pygame.Surface(size))
+        self.surface.fill(BLACK)
+        return self.surface
+    
+    @profiled("upscale")
+    def present(self, surface):
+        if self.smooth:
+            pygame.transform.smoothscale(self.surface, surface.get_size(), surface)
+        else:
+            pygame.transform.scale(self.surface, surface.get_size(), surface)
+    
+    def update(self, frame_seconds):
+        # frame_seconds is the work done for the frame, not counting the wait for the next one.
+        # An uncapped frame rate has no budget to scale against.
+        if not self.dynamic or settings.game.frame_rate <= 0:
+            return
+        self.frame_times.append(frame_seconds)
+        if len(self.frame_times) < RENDER_SCALE_WINDOW:
+            return
+        average = sum(self.frame_times) / len(self.frame_times)
+        budget = 1.0 / settings.game.frame_rate
+        if average > budget * 0.9 and self.scale > self.min_scale:
+            self.set_scale(self.scale - RENDER_SCALE_STEP)
+        elif average < budget * 0.5 and self.scale < self.max_scale:
+            self.set_scale(self.scale + RENDER_SCALE_STEP)
+
+render_scaler = RenderScaler(PERFORMANCE.get("render_scale", 1.0), PERFORMANCE.get("dynamic_render_scale", False),
+                             PERFORMANCE.get("min_render_scale", 0.5), PERFORMANCE.get("smooth_upscale", False))
+
+def wrap_text(text, text_font, max_width):
+    lines, current_line = [], ""
+    for word in text.split():
+        test_line = current_line + word + " "
+        if text_font.size(test_line)[0] < max_width:
+            current_line = test_line
+        else:
+            lines.append(current_line)
+            current_line = word + " "
+    lines.append(current_line)
+    return lines
+
+WALK_TILT = 33
+WALK_ANGLES = (0, WALK_TILT, -WALK_TILT)
+
+# Purely visual randomness stays off the global generator so replays don't depend on what was drawn.
+cosmetic_random = random.Random()
 
 class Character:
     def __init__(self, name, image_path, portrait_path, width, height, hp, position, battle_position, placeholder_color):
         self.name = name
+        # Set by GameSession for configured characters; hot reloads match on it.
+        self.key = None
         self.original_img = get_image(image_path, width, height, placeholder_color)
-        self.img = self.original_img.copy()
-        self.portrait = get_image(portrait_path, 100, 100, placeholder_color)
+        self.frames = {
+            angle: get_rotated_image(image_path, width, height, placeholder_color, angle)
+            for angle in WALK_ANGLES
+        }
+        self.img = self.original_img
+        self.image_path = image_path
+        self.portrait_path = portrait_path
+        self.placeholder_color = placeholder_color
         self.width, self.height = width, height
         self.hp, self.max_hp = hp, hp
         self.x, self.y = position
+        self.prev_x, self.prev_y = self.x, self.y
         self.battle_x, self.battle_y = battle_position
         self.is_dead = False
         self.animation_frame = 0
@@ -136,6 +949,7 @@ class Character:
         self.walk_timer = 0
         self.walking = False
         self.walk_switch_frames = 10
+        self.health_bar = Widget(build_health_bar)
     
     def rotate(self, direction):
         base_angle = 0
@@ -153,9 +967,9 @@ class Character:
                 self.walk_cycle = 1 - self.walk_cycle
             
             if self.walk_cycle == 0:
-                tilt_angle = 33
+                tilt_angle = WALK_TILT
             else:
-                tilt_angle = -33
+                tilt_angle = -WALK_TILT
             
             if direction == "left":
                 self.direction = tilt_angle
@@ -166,20 +980,40 @@ class Character:
         else:
             self.direction = base_angle
         
-        self.img = pygame.transform.rotate(self.original_img, self.direction)
+        self.img = self.frames[self.direction]
     
-    def draw(self, surface, x=None, y=None):
+    @property
+    def portrait(self):
+        return get_image(self.portrait_path, 100, 100, self.placeholder_color)
+    
+    def save_position(self):
+        self.prev_x, self.prev_y = self.x, self.y
+    
+    def interpolated_position(self, alpha):
+        return (
+            round(self.prev_x + (self.x - self.prev_x) * alpha),
+            round(self.prev_y + (self.y - self.prev_y) * alpha)
+        )
+    
+    @profiled("character_draw")
+    def draw(self, surface, x=None, y=None, scale=1.0):
         draw_x = x if x is not None else self.x
         draw_y = y if y is not None else self.y
         
-        rotated_rect = self.img.get_rect(center=(draw_x + self.width//2, draw_y + self.height//2))
+        img = self.img
+        center = (draw_x + self.width//2, draw_y + self.height//2)
+        if scale != 1.0:
+            angle = self.direction if self.direction in self.frames else 0
+            img = get_rotated_image(self.image_path, round(self.width * scale), round(self.height * scale), self.placeholder_color, angle)
+            center = (round(center[0] * scale), round(center[1] * scale))
+        rotated_rect = img.get_rect(center=center)
         
         if self.animation_frame > 0:
-            self.animation_frame -= 1
-            offset = random.randint(-5, 5)
-            surface.blit(self.img, (rotated_rect.x + offset, rotated_rect.y + offset))
+            offset = round(cosmetic_random.randint(-5, 5) * scale)
+            drawn = surface.blit(img, (rotated_rect.x + offset, rotated_rect.y + offset))
         else:
-            surface.blit(self.img, rotated_rect)
+            drawn = surface.blit(img, rotated_rect)
+        mark_dirty(drawn, img)
     
     def take_damage(self, damage):
         self.hp = max(0, self.hp - damage)
@@ -188,15 +1022,7 @@ class Character:
             self.is_dead = True
     
     def draw_health_bar(self, surface, x, y):
-        bar_width, bar_height = 200, 20
-        fill_width = (self.hp / self.max_hp) * bar_width
-        
-        pygame.draw.rect(surface, RED, (x, y, bar_width, bar_height))
-        pygame.draw.rect(surface, GREEN, (x, y, fill_width, bar_height))
-        pygame.draw.rect(surface, BLACK, (x, y, bar_width, bar_height), 2)
-        
-        health_text = font.render(f'{self.name}: {self.hp}/{self.max_hp} HP', True, WHITE)
-        surface.blit(health_text, (x, y - 25))
+        self.health_bar.draw(surface, (x, y - HEALTH_LABEL_HEIGHT), self.name, self.hp, self.max_hp)
 
 class NPC(Character):
     def __init__(self, character_config):
@@ -211,9 +1037,11 @@ class NPC(Character):
             character_config.get("battle_position", [0, 0]),
             character_config["placeholder_color"]
         )
-        self.dialogs = character_config.get("dialogs", [])
+        self.dialogs = character_dialogs(character_config)
         self.movement_timer = 0
         self.move_direction = random.choice(["left", "right", "up", "down"])
+        # NPCs stay inside their home chunk.
+        self.area = pygame.Rect(0, 0, WIDTH, HEIGHT)
     
     def wander(self):
         if self.movement_timer <= 0:
@@ -224,16 +1052,17 @@ class NPC(Character):
         else:
             self.movement_timer -= 1
         
-        if self.move_direction == "left" and self.x > 50:
+        area = self.area
+        if self.move_direction == "left" and self.x > area.left + 50:
             self.x -= 1
             self.walking = True
-        elif self.move_direction == "right" and self.x < WIDTH - self.width - 50:
+        elif self.move_direction == "right" and self.x < area.right - self.width - 50:
             self.x += 1
             self.walking = True
-        elif self.move_direction == "up" and self.y > 250:
+        elif self.move_direction == "up" and self.y > area.top + 250:
             self.y -= 1
             self.walking = True
-        elif self.move_direction == "down" and self.y < HEIGHT - self.height - 50:
+        elif self.move_direction == "down" and self.y < area.bottom - self.height - 50:
             self.y += 1
             self.walking = True
         else:
@@ -254,16 +1083,168 @@ class Enemy(Character):
             character_config["battle_position"],
             character_config["placeholder_color"]
         )
-        self.dialogs = character_config.get("dialogs", [])
+        self.dialogs = character_dialogs(character_config)
+
+DIALOG_MAGIC = b"SOTDIALG"
+DIALOG_VERSION = 1
+DIALOG_HEADER = struct.Struct("<8sII")
+DIALOG_SOURCE_DIR = "dialogs"
+DEFAULT_LANGUAGE = "en"
+
+def load_dialog_sources(directory):
+    # One <language>.json per language, each mapping conversation names to their lines.
+    conversations = {}
+    for filename in sorted(os.listdir(directory)):
+        language, extension = os.path.splitext(filename)
+        if extension != ".json":
+            continue
+        with open(os.path.join(directory, filename), 'r', encoding="utf-8") as f:
+            for name, lines in json.load(f).items():
+                conversations[f"{name}@{language}"] = lines
+    return conversations
+
+def dialog_key_hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+def write_dialog_corpus(path, conversations):
+    entries = sorted((dialog_key_hash(key), key, lines) for key, lines in conversations.items())
+    for (first, first_key, _), (second, second_key, _) in zip(entries, entries[1:]):
+        if first == second:
+            raise ValueError(f"Dialog keys {first_key} and {second_key} collide; rename one of them")
+    
+    hashes, locations, blobs, offset = array('Q'), array('I'), [], 0
+    for key_hash, key, lines in entries:
+        blob = json.dumps({"key": key, "lines": lines}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        hashes.append(key_hash)
+        locations.extend((offset, len(blob)))
+        blobs.append(blob)
+        offset += len(blob)
+    
+    with open(path + ".tmp", 'wb') as f:
+        f.write(DIALOG_HEADER.pack(DIALOG_MAGIC, DIALOG_VERSION, len(entries)))
+        f.write(hashes.tobytes())
+        f.write(locations.tobytes())
+        for blob in blobs:
+            f.write(blob)
+    os.replace(path + ".tmp", path)
+    return len(entries)
+
+class DialogCorpus:
+    # Layout: magic, version, conversation count, the sorted 64-bit hashes of every "name@language" key,
+    # an (offset, length) pair per hash, then each conversation as UTF-8 JSON. Nothing is parsed up front:
+    # lookups binary-search the mapped hash table, so opening costs the same for any size of script.
+    def __init__(self, path, cache_entries):
+        self.path = path
+        self.file = open(path, 'rb')
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count = DIALOG_HEADER.unpack_from(self.buffer, 0)
+        if magic != DIALOG_MAGIC or version != DIALOG_VERSION:
+            self.buffer.close()
+            self.file.close()
+            raise ValueError(f"{path} is not a version {DIALOG_VERSION} dialog corpus")
+        start = DIALOG_HEADER.size
+        self.hashes = memoryview(self.buffer)[start:start + count * 8].cast("Q")
+        self.locations = memoryview(self.buffer)[start + count * 8:start + count * 16].cast("I")
+        self.data_start = start + count * 16
+        self.cache_entries = cache_entries
+        self.conversations = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    def find(self, key):
+        key_hash = dialog_key_hash(key)
+        position = bisect_left(self.hashes, key_hash)
+        if position < len(self.hashes) and self.hashes[position] == key_hash:
+            return position
+        return None
+    
+    def load(self, key):
+        position = self.find(key)
+        if position is None:
+            return None
+        offset = self.data_start + self.locations[position * 2]
+        entry = json.loads(self.buffer[offset:offset + self.locations[position * 2 + 1]].decode("utf-8"))
+        return entry["lines"] if entry["key"] == key else None
+    
+    def conversation(self, name, language):
+        cache_key = (name, language)
+        lines = self.conversations.get(cache_key)
+        if lines is not None:
+            self.conversations.move_to_end(cache_key)
+            self.hits += 1
+            return lines
+        
+        self.misses += 1
+        lines = self.load(f"{name}@{language}")
+        if lines is None:
+            lines = self.load(f"{name}@{DEFAULT_LANGUAGE}") or []
+        self.conversations[cache_key] = lines
+        if len(self.conversations) > self.cache_entries:
+            self.conversations.popitem(last=False)
+        return lines
+    
+    def stats(self):
+        return {"conversations": len(self.hashes), "cached": len(self.conversations), "hits": self.hits, "misses": self.misses}
+    
+    def close(self):
+        self.hashes.release()
+        self.locations.release()
+        self.buffer.close()
+        self.file.close()
+
+def dialog_sources_modified(directory):
+    if not os.path.isdir(directory):
+        return None
+    times = [entry.stat().st_mtime for entry in os.scandir(directory) if entry.name.endswith(".json")]
+    return max(times) if times else None
+
+def open_dialog_corpus(path, source_dir=DIALOG_SOURCE_DIR):
+    # Rebuilt from the sources when they're newer, so editing dialogs/*.json needs no extra step.
+    sources_modified = dialog_sources_modified(source_dir)
+    try:
+        if sources_modified is not None and (not os.path.exists(path) or os.path.getmtime(path) < sources_modified):
+            write_dialog_corpus(path, load_dialog_sources(source_dir))
+        if not os.path.exists(path):
+            return None
+        return DialogCorpus(path, PERFORMANCE.get("dialog_cache_entries", 32))
+    except (OSError, ValueError, KeyError, struct.error) as error:
+        print(f"Ignoring dialog corpus {path}: {error}")
+        return None
+
+dialog_corpus = open_dialog_corpus(config["game"].get("dialog_corpus", "dialogs.corpus"))
+
+def reload_dialog_corpus():
+    # A corpus that fails to rebuild (say, a source caught mid-save) keeps the old one in service.
+    global dialog_corpus
+    corpus = open_dialog_corpus(config["game"].get("dialog_corpus", "dialogs.corpus"))
+    if corpus is not None:
+        if dialog_corpus is not None:
+            dialog_corpus.close()
+        dialog_corpus = corpus
+
+def character_dialogs(character_config):
+    # Either a conversation name in the corpus or an inline list of lines.
+    return character_config.get("dialog") or character_config.get("dialogs", [])
+
+def resolve_dialogs(dialogs):
+    if not isinstance(dialogs, str):
+        return dialogs
+    if dialog_corpus is None:
+        return []
+    return dialog_corpus.conversation(dialogs, config["game"].get("language", DEFAULT_LANGUAGE))
 
 class DialogSystem:
     def __init__(self):
         self.dialogs = []
+        self.layouts = []
         self.current_dialog = 0
         self.active = False
+        self.box = Widget(build_dialog_box)
     
     def start_dialog(self, dialogs):
+        asset_loader.preload(dialog_portraits(dialogs))
         self.dialogs = dialogs
+        self.layouts = [wrap_text(entry["text"], font, WIDTH - 200) for entry in dialogs]
         self.current_dialog = 0
         self.active = True
     
@@ -274,51 +1255,22 @@ class DialogSystem:
             return False
         return True
     
+    @profiled("dialog_draw")
     def draw(self, surface):
         if not self.active or self.current_dialog >= len(self.dialogs):
             return
         
         current = self.dialogs[self.current_dialog]
-        
-        dialog_box = pygame.Rect(50, 400, WIDTH - 100, 150)
-        pygame.draw.rect(surface, DIALOG_BG, dialog_box)
-        pygame.draw.rect(surface, WHITE, dialog_box, 2)
-        
-        text_x = 70
-        if "portrait" in current:
-            portrait_img = get_image(current["portrait"], 100, 100, (150, 150, 150))
-            portrait_box = pygame.Rect(60, 410, 100, 100)
-            pygame.draw.rect(surface, (70, 70, 70), portrait_box)
-            surface.blit(portrait_img, portrait_box)
-            text_x = 180
-        
-        text = current["text"]
-        words = text.split()
-        lines, current_line = [], ""
-        
-        for word in words:
-            test_line = current_line + word + " "
-            if font.size(test_line)[0] < WIDTH - 200:
-                current_line = test_line
-            else:
-                lines.append(current_line)
-                current_line = word + " "
-        
-        lines.append(current_line)
-        
-        for i, line in enumerate(lines):
-            surface.blit(font.render(line, True, WHITE), (text_x, 430 + i * 30))
-        
-        surface.blit(small_font.render("Press SPACE to continue...", True, WHITE), (WIDTH - 250, 520))
+        portrait = get_image(current["portrait"], 100, 100, DIALOG_PORTRAIT_COLOR) if "portrait" in current else None
+        self.box.draw(surface, (50, 400), self.layouts, self.current_dialog, portrait)
 
 class BattleSystem:
-    def __init__(self, player, config):
+    def __init__(self, player, settings):
         self.player = player
         self.enemy = None
-        self.config = config
+        self.settings = settings
         self.player_turn = True
         self.message = ""
-        self.actions = config["actions"]
         self.selected_action = 0
         self.active = False
         self.animation_timer = 0
@@ -331,7 +1283,9 @@ class BattleSystem:
         self.block_prompt_duration = 90
         self.block_window_timer = 0
         self.block_window_duration = 60
-        self.battle_background = get_image('battle_background.png', WIDTH, HEIGHT, BATTLE_BG)
+        self.solution = None
+        self.action_menu = Widget(build_action_menu)
+        self.message_line = Widget(build_message_line, "midtop")
     
     def start_battle(self, enemy):
         self.enemy = enemy
@@ -343,6 +1297,21 @@ class BattleSystem:
         self.battle_result = None
         self.block_active = False
         self.block_prompt_visible = False
+        self.plan()
+    
+    def plan(self):
+        # Solved on the loader threads from the start of the battle, so TAB rarely has to wait for it.
+        self.solution = None
+        if self.enemy is not None and self.can_auto():
+            self.solution = asset_loader.executor.submit(
+                battle_solver.load_or_solve, config["battle"], self.player.max_hp, self.enemy.max_hp)
+    
+    def can_auto(self):
+        return battle_solver is not None and all(action in battle_solver.SOLVABLE_ACTIONS for action in self.actions)
+    
+    @property
+    def actions(self):
+        return self.settings.actions
     
     def select_action(self, direction):
         self.selected_action = (self.selected_action + direction) % len(self.actions)
@@ -350,9 +1319,9 @@ class BattleSystem:
     def execute_action(self):
         action = self.actions[self.selected_action]
         
+        amount = 0
         if action == "Attack":
-            damage_config = self.config["player_move_damage"]["Attack"]
-            damage = random.randint(damage_config["min"], damage_config["max"])
+            damage = amount = self.settings.player_move_damage["Attack"].roll()
             self.enemy.take_damage(damage)
             self.message = f"You hit {self.enemy.name} for {damage} damage!"
             self.player_turn = False
@@ -363,8 +1332,7 @@ class BattleSystem:
             self.block_window_timer = self.block_window_duration
         
         elif action == "Special":
-            damage_config = self.config["player_move_damage"]["Special"]
-            damage = random.randint(damage_config["min"], damage_config["max"])
+            damage = amount = self.settings.player_move_damage["Special"].roll()
             self.enemy.take_damage(damage)
             self.message = f"Special attack! {damage} damage dealt to {self.enemy.name}!"
             self.player_turn = False
@@ -375,7 +1343,7 @@ class BattleSystem:
             self.block_window_timer = self.block_window_duration
         
         elif action == "Item":
-            heal = self.config["heal_amount"]
+            heal = amount = self.settings.heal_amount
             self.player.hp = min(self.player.hp + heal, self.player.max_hp)
             self.message = f"You used a health potion. +{heal} HP!"
             self.player_turn = False
@@ -398,27 +1366,47 @@ class BattleSystem:
             else:
                 self.battle_result = "win"
         
+        if telemetry is not None:
+            if action in ("Attack", "Special"):
+                telemetry.record("damage", self.enemy.name, self.player.name, amount)
+            telemetry.record("action", action, self.battle_result or "", amount)
         return self.battle_result
     
+    def auto_action(self):
+        # Optimal move from the solver's policy table, which is solved once per config and cached on disk.
+        # Waiting for the solve rather than skipping the key keeps replays independent of its timing.
+        if not self.can_auto():
+            return None
+        if self.solution is None:
+            self.plan()
+        try:
+            solution = self.solution.result()
+        except (OSError, ValueError) as error:
+            print(f"No auto action: {error}")
+            return None
+        return solution.best_action(self.player.hp, self.enemy.hp)
+    
     def activate_block(self):
-        if not self.player_turn and self.enemy_attack_pending and self.block_window_timer > 0:
+        accepted = not self.player_turn and self.enemy_attack_pending and self.block_window_timer > 0
+        if accepted:
             self.block_active = True
-            return True
-        return False
+        if telemetry is not None:
+            telemetry.record("block", self.enemy.name, "", int(accepted))
+        return accepted
     
     def enemy_turn(self):
-        damage_config = self.config["enemy_move_damage"]
-        base_damage = random.randint(damage_config["min"], damage_config["max"])
+        base_damage = self.settings.enemy_move_damage.roll()
     
         if self.block_active:
-            block_reduction = self.config.get("block_reduction", 0.5)
-            damage = int(base_damage * block_reduction)
+            damage = int(base_damage * self.settings.block_reduction)
             self.message = f"BLOCKED! {self.enemy.name} attacks! You take only {damage} damage!"
         else:
             damage = base_damage
             self.message = f"{self.enemy.name} attacks! You take {damage} damage!"
     
         self.player.take_damage(damage)
+        if telemetry is not None:
+            telemetry.record("damage", self.player.name, self.enemy.name, damage, int(self.block_active))
     
         self.block_active = False
         self.block_prompt_visible = False
@@ -450,248 +1438,1750 @@ class BattleSystem:
                 return self.enemy_turn()
         return None
     
+    def draw_scene(self, surface, scale=1.0):
+        if not self.active:
+            return
+        self.player.draw(surface, self.player.battle_x, self.player.battle_y, scale)
+        self.enemy.draw(surface, self.enemy.battle_x, self.enemy.battle_y, scale)
+    
+    @profiled("battle_draw")
     def draw(self, surface):
         if not self.active:
             return
         
-        surface.blit(self.battle_background, (0, 0))
-        
-        self.player.draw(surface, self.player.battle_x, self.player.battle_y)
-        self.enemy.draw(surface, self.enemy.battle_x, self.enemy.battle_y)
-        
         self.player.draw_health_bar(surface, 50, 50)
         self.enemy.draw_health_bar(surface, WIDTH - 250, 50)
         
-        message_text = font.render(self.message, True, WHITE)
-        surface.blit(message_text, (WIDTH // 2 - message_text.get_width() // 2, 150))
+        self.message_line.draw(surface, (WIDTH // 2, 150), self.message)
         
         if self.block_prompt_visible:
             if (self.block_prompt_timer // 10) % 2 == 0:
-                block_text = font.render("Press SPACE to BLOCK!", True, (255, 255, 0))
+                block_text = render_text(font, "Press SPACE to BLOCK!", (255, 255, 0))
                 block_box = pygame.Rect(WIDTH // 2 - 150, 200, 300, 50)
                 pygame.draw.rect(surface, (100, 0, 0), block_box)
                 pygame.draw.rect(surface, (255, 255, 0), block_box, 3)
+                mark_dirty(block_box)
                 surface.blit(block_text, (WIDTH // 2 - block_text.get_width() // 2, 210))
         
         if self.block_active:
-            block_indicator = font.render("BLOCKING!", True, (0, 255, 0))
-            surface.blit(block_indicator, (self.player.battle_x, self.player.battle_y - 40))
+            block_indicator = render_text(font, "BLOCKING!", (0, 255, 0))
+            mark_dirty(surface.blit(block_indicator, (self.player.battle_x, self.player.battle_y - 40)))
         
         if self.player_turn and not self.enemy_attack_pending:
-            action_box = pygame.Rect(50, 200, 200, 30 * len(self.actions) + 20)
-            pygame.draw.rect(surface, DIALOG_BG, action_box)
-            pygame.draw.rect(surface, WHITE, action_box, 2)
+            action_box = self.action_menu.draw(surface, (50, 200), self.actions, self.selected_action)
             
-            for i, action in enumerate(self.actions):
-                color = GREEN if i == self.selected_action else WHITE
-                action_text = font.render(action, True, color)
-                surface.blit(action_text, (70, 210 + i * 30))
+            if self.can_auto():
+                auto_text = render_text(small_font, "TAB: auto", WHITE)
+                mark_dirty(surface.blit(auto_text, (70, action_box.bottom + 10)), auto_text)
+
+CROWD_STATE_ARRAYS = ("x", "y", "move_direction", "movement_timer", "walking", "walk_cycle", "walk_timer", "frame_index")
+CROWD_DX = (-1, 1, 0, 0)
+CROWD_DY = (0, 0, -1, 1)
+
+class CrowdSimulation:
+    # Directions are 0=left, 1=right, 2=up, 3=down; frame indices follow WALK_ANGLES.
+    def __init__(self, character_config, count, seed=None):
+        if np is None:
+            raise RuntimeError("Crowd mode needs NumPy (pip install numpy)")
+        self.name = character_config["name"]
+        self.width, self.height = character_config["width"], character_config["height"]
+        self.image, self.placeholder_color = character_config["image"], character_config["placeholder_color"]
+        self.frames, self.frame_offsets = self.sprite_frames(self.width, self.height)
+        self.scaled_frames = {}
+        self.walk_switch_frames = 10
+        # Counts steps so the dirty-rect renderer can tell a moved crowd from an unchanged one.
+        self.steps = 0
+        self.min_x, self.max_x = 50, WIDTH - self.width - 50
+        self.min_y, self.max_y = 250, HEIGHT - self.height - 50
+        self.dx = np.array(CROWD_DX, dtype=np.int32)
+        self.dy = np.array(CROWD_DY, dtype=np.int32)
+        
+        self.rng = np.random.default_rng(seed)
+        self.count = count
+        self.x = self.rng.integers(self.min_x, max(self.min_x, self.max_x) + 1, count).astype(np.int32)
+        self.y = self.rng.integers(self.min_y, max(self.min_y, self.max_y) + 1, count).astype(np.int32)
+        self.move_direction = self.rng.integers(0, 4, count).astype(np.int8)
+        self.movement_timer = np.zeros(count, dtype=np.int32)
+        self.walking = np.zeros(count, dtype=bool)
+        self.walk_cycle = np.zeros(count, dtype=np.int8)
+        self.walk_timer = np.zeros(count, dtype=np.int32)
+        self.frame_index = np.zeros(count, dtype=np.int8)
+    
+    def sprite_frames(self, width, height):
+        frames = [get_rotated_image(self.image, width, height, self.placeholder_color, angle) for angle in WALK_ANGLES]
+        offsets = np.array([
+            (width // 2 - frame.get_width() // 2, height // 2 - frame.get_height() // 2)
+            for frame in frames
+        ], dtype=np.int32)
+        return frames, offsets
+    
+    def advance_walk(self, mask):
+        self.walk_timer[mask] += 1
+        switch = mask & (self.walk_timer >= self.walk_switch_frames)
+        self.walk_timer[switch] = 0
+        self.walk_cycle[switch] ^= 1
+    
+    def step(self):
+        # Same rules as NPC.wander, applied to the whole population at once.
+        self.steps += 1
+        reset = self.movement_timer <= 0
+        resets = int(np.count_nonzero(reset))
+        self.movement_timer -= 1
+        if resets:
+            self.movement_timer[reset] = self.rng.integers(30, 121, resets)
+            self.move_direction[reset] = self.rng.integers(0, 4, resets)
+            self.advance_walk(reset)
+        
+        direction = self.move_direction
+        self.walking = (
+            ((direction == 0) & (self.x > self.min_x)) |
+            ((direction == 1) & (self.x < self.max_x)) |
+            ((direction == 2) & (self.y > self.min_y)) |
+            ((direction == 3) & (self.y < self.max_y))
+        )
+        self.x += self.dx[direction] * self.walking
+        self.y += self.dy[direction] * self.walking
+        self.advance_walk(self.walking)
+        
+        self.frame_index = np.where(self.walking, 1 + self.walk_cycle, 0).astype(np.int8)
+        return self.frame_index
+    
+    def state_bytes(self):
+        rng_state = json.dumps(self.rng.bit_generator.state).encode("utf-8")
+        arrays = [getattr(self, name).tobytes() for name in CROWD_STATE_ARRAYS]
+        return struct.pack("<II", self.count, len(rng_state)) + rng_state + b"".join(arrays)
+    
+    def load_state_bytes(self, data):
+        count, rng_length = struct.unpack_from("<II", data, 0)
+        if count != self.count:
+            raise ValueError(f"Snapshot has {count} crowd members, the crowd has {self.count}")
+        self.rng.bit_generator.state = json.loads(bytes(data[8:8 + rng_length]).decode("utf-8"))
+        offset = 8 + rng_length
+        for name in CROWD_STATE_ARRAYS:
+            current = getattr(self, name)
+            setattr(self, name, np.frombuffer(data, dtype=current.dtype, count=current.size, offset=offset).copy())
+            offset += current.nbytes
+    
+    def draw(self, surface, offset_x=0, offset_y=0, scale=1.0):
+        if not self.count:
+            return
+        frames, frame_offsets, x, y = self.frames, self.frame_offsets, self.x + offset_x, self.y + offset_y
+        if scale != 1.0:
+            if scale not in self.scaled_frames:
+                self.scaled_frames[scale] = self.sprite_frames(round(self.width * scale), round(self.height * scale))
+            frames, frame_offsets = self.scaled_frames[scale]
+            x, y = np.rint(x * scale).astype(np.int32), np.rint(y * scale).astype(np.int32)
+        offsets = frame_offsets[self.frame_index]
+        xs = (x + offsets[:, 0]).tolist()
+        ys = (y + offsets[:, 1]).tolist()
+        surface.blits([(frames[i], (x, y)) for i, x, y in zip(self.frame_index.tolist(), xs, ys)], doreturn=False)
+        
+        frame_width = max(frame.get_width() for frame in frames)
+        frame_height = max(frame.get_height() for frame in frames)
+        left, top = min(xs), min(ys)
+        mark_dirty(pygame.Rect(left, top, max(xs) - left + frame_width, max(ys) - top + frame_height), self.steps)
+
+def create_crowd():
+    crowd_config = config["game"].get("crowd", {})
+    count = crowd_config.get("count", 0)
+    if count <= 0:
+        return None
+    for npc_config in config["characters"]["npcs"]:
+        if npc_config["name"] == crowd_config.get("npc"):
+            return CrowdSimulation(npc_config, count, random.getrandbits(32))
+    return CrowdSimulation(config["characters"]["npcs"][0], count, random.getrandbits(32))
+
+class SpatialGrid:
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.entity_cells = {}
+    
+    def cell_for(self, entity):
+        center_x = entity.x + entity.width / 2
+        center_y = entity.y + entity.height / 2
+        return (int(center_x // self.cell_size), int(center_y // self.cell_size))
+    
+    def insert(self, entity):
+        cell = self.cell_for(entity)
+        self.cells.setdefault(cell, []).append(entity)
+        self.entity_cells[entity] = cell
+    
+    def remove(self, entity):
+        cell = self.entity_cells.pop(entity)
+        bucket = self.cells[cell]
+        bucket.remove(entity)
+        if not bucket:
+            del self.cells[cell]
+    
+    def update(self, entity):
+        cell = self.cell_for(entity)
+        if self.entity_cells.get(entity) != cell:
+            if entity in self.entity_cells:
+                self.remove(entity)
+            self.cells.setdefault(cell, []).append(entity)
+            self.entity_cells[entity] = cell
+    
+    def nearest(self, x, y, radius, accept=None):
+        size = self.cell_size
+        best, best_distance = None, radius * radius
+        
+        for grid_x in range(int((x - radius) // size), int((x + radius) // size) + 1):
+            for grid_y in range(int((y - radius) // size), int((y + radius) // size) + 1):
+                for entity in self.cells.get((grid_x, grid_y), ()):
+                    dx = entity.x + entity.width / 2 - x
+                    dy = entity.y + entity.height / 2 - y
+                    distance = dx * dx + dy * dy
+                    if distance < best_distance and (accept is None or accept(entity)):
+                        best, best_distance = entity, distance
+        return best
+
+def is_interactable(character):
+    return not (isinstance(character, Enemy) and character.is_dead)
+
+def world_character_configs(game_config, kind):
+    # The "characters" section is chunk (0, 0); chunk characters are positioned relative to their chunk.
+    world = settings.world
+    configs = list(game_config["characters"][kind])
+    for chunk_config in world.chunks:
+        column, row = chunk_config["position"]
+        for character_config in chunk_config.get(kind, []):
+            x, y = character_config["default_position"]
+            position = [x + column * world.chunk_width, y + row * world.chunk_height]
+            configs.append(dict(character_config, default_position=position, chunk=(column, row)))
+    return configs
+
+def character_keys(character_configs):
+    # Chunk characters often reuse a template's name, so a character is its chunk, its name and
+    # which copy of that name it is there.
+    counts = {}
+    keys = []
+    for character_config in character_configs:
+        key = (tuple(character_config.get("chunk", (0, 0))), character_config["name"])
+        counts[key] = counts.get(key, 0) + 1
+        keys.append(key + (counts[key],))
+    return keys
+
+def chunk_backgrounds(world_settings):
+    filename, _, _, color = BACKGROUND_ASSET
+    default = (filename, world_settings.chunk_width, world_settings.chunk_height, color)
+    backgrounds = {(0, 0): default}
+    for chunk_config in world_settings.chunks:
+        position = tuple(chunk_config["position"])
+        backgrounds.setdefault(position, default)
+        if "background" in chunk_config:
+            chunk_color = tuple(chunk_config.get("placeholder_color", color))
+            backgrounds[position] = (chunk_config["background"], world_settings.chunk_width, world_settings.chunk_height, chunk_color)
+    return backgrounds
+
+class Chunk:
+    def __init__(self, position, rect, background):
+        self.position = position
+        self.rect = rect
+        self.background = background
+        self.npcs = []
+        self.enemies = []
+
+class ChunkWorld:
+    # The world is a grid of screen-sized (by default) chunks. Game logic only runs for chunks near the
+    # player; drawing streams chunk backgrounds in on the asset loader's threads and drops distant ones.
+    def __init__(self, world_settings):
+        self.chunk_width = world_settings.chunk_width
+        self.chunk_height = world_settings.chunk_height
+        self.stream_radius = world_settings.stream_radius
+        self.chunks = {
+            position: self.create_chunk(position, background)
+            for position, background in chunk_backgrounds(world_settings).items()
+        }
+        
+        self.bounds = pygame.Rect(0, 0, self.chunk_width, self.chunk_height).unionall([chunk.rect for chunk in self.chunks.values()])
+        self.active_position = None
+        self.active_npcs = []
+        self.margin = 0
+        self.stream_position = None
+        self.streamed = []
+    
+    def create_chunk(self, position, background):
+        column, row = position
+        rect = pygame.Rect(column * self.chunk_width, row * self.chunk_height, self.chunk_width, self.chunk_height)
+        return Chunk(position, rect, background)
+    
+    def chunk_position(self, x, y):
+        return (int(x // self.chunk_width), int(y // self.chunk_height))
+    
+    def contains(self, x, y):
+        return self.chunk_position(x, y) in self.chunks
+    
+    def nearby(self, position, radius):
+        column, row = position
+        return [
+            self.chunks[(column + dx, row + dy)]
+            for dy in range(-radius, radius + 1)
+            for dx in range(-radius, radius + 1)
+            if (column + dx, row + dy) in self.chunks
+        ]
+    
+    def assign(self, enemies, npcs):
+        for chunk in self.chunks.values():
+            chunk.enemies, chunk.npcs = [], []
+        for characters, attribute in ((enemies, "enemies"), (npcs, "npcs")):
+            for character in characters:
+                x, y = character.x + character.width / 2, character.y + character.height / 2
+                chunk = self.chunks.get(self.chunk_position(x, y))
+                if chunk is None:
+                    raise ValueError(f"{character.name} is outside every world chunk")
+                getattr(chunk, attribute).append(character)
+                if attribute == "npcs":
+                    character.area = chunk.rect
+        # Characters belong to the chunk under their center, so their sprites can reach this far past it.
+        self.margin = max([max(character.width, character.height) for character in enemies + npcs], default=0)
+        self.active_position = None
+    
+    def npcs_near(self, x, y):
+        position = self.chunk_position(x, y)
+        if position != self.active_position:
+            self.active_position = position
+            self.active_npcs = [npc for chunk in self.nearby(position, self.stream_radius) for npc in chunk.npcs]
+        return self.active_npcs
+    
+    def camera(self, focus_x, focus_y):
+        camera = pygame.Rect(0, 0, WIDTH, HEIGHT)
+        camera.center = (round(focus_x), round(focus_y))
+        return camera.clamp(self.bounds)
+    
+    def visible(self, camera):
+        first = self.chunk_position(camera.left, camera.top)
+        last = self.chunk_position(camera.right - 1, camera.bottom - 1)
+        return [
+            self.chunks[(column, row)]
+            for row in range(first[1], last[1] + 1)
+            for column in range(first[0], last[0] + 1)
+            if (column, row) in self.chunks
+        ]
+    
+    def stream(self, camera, scale=1.0):
+        # Streamed backgrounds are tracked at the render scale they were loaded for.
+        position = self.chunk_position(*camera.center)
+        if (position, scale) == self.stream_position:
+            return
+        self.stream_position = (position, scale)
+        wanted = self.nearby(position, self.stream_radius)
+        for chunk in self.visible(camera):
+            if chunk not in wanted:
+                wanted.append(chunk)
+        wanted = [scaled_asset(chunk.background, scale) for chunk in wanted]
+        asset_loader.preload(wanted)
+        
+        # One extra ring of slack so walking back and forth over a border doesn't reload anything.
+        keep = {scaled_asset(chunk.background, scale) for chunk in self.nearby(position, self.stream_radius + 1)}
+        keep.update(wanted)
+        for background in self.streamed:
+            if background not in keep:
+                assets.discard(*background)
+        self.streamed = [background for background in self.streamed if background in keep]
+        self.streamed += [background for background in wanted if background not in self.streamed]
+    
+    def tile(self, chunk, scale=1.0):
+        background = scaled_asset(chunk.background, scale)
+        if assets.ready(*background):
+            return get_image(*background)
+        # Still decoding (or evicted from the cache since): show its placeholder color rather than stall the frame.
+        asset_loader.preload([background])
+        filename, width, height, color = background
+        return layer_cache.get(("chunk_placeholder", color), (width, height, color), create_placeholder_image)
+    
+    def view(self, camera, scale=1.0):
+        visible = self.visible(camera)
+        if len(visible) == 1 and visible[0].rect == camera:
+            return self.tile(visible[0], scale)
+        tiles = tuple((self.tile(chunk, scale), chunk.rect.topleft) for chunk in visible)
+        return layer_cache.get("world_view", (camera.topleft, tiles, scale), compose_view)
+
+def compose_view(camera_position, tiles, scale=1.0):
+    view = to_display_format(pygame.Surface((round(WIDTH * scale), round(HEIGHT * scale))))
+    view.fill(BLACK)
+    for tile, (x, y) in tiles:
+        view.blit(tile, (round((x - camera_position[0]) * scale), round((y - camera_position[1]) * scale)))
+    return view
 
 EXPLORE, DIALOG, BATTLE, GAME_OVER, VICTORY = 0, 1, 2, 3, 4
+STATE_NAMES = {EXPLORE: "EXPLORE", DIALOG: "DIALOG", BATTLE: "BATTLE", GAME_OVER: "GAME_OVER", VICTORY: "VICTORY"}
 
-background = get_image('background.png', WIDTH, HEIGHT, (100, 100, 200))
-stick_of_truth = get_image('stick_of_truth.png', 300, 300, (220, 180, 50))
+BACKGROUND_ASSET = ('background.png', WIDTH, HEIGHT, (100, 100, 200))
+BATTLE_BACKGROUND_ASSET = ('battle_background.png', WIDTH, HEIGHT, BATTLE_BG)
+STICK_OF_TRUTH_ASSET = ('stick_of_truth.png', 300, 300, (220, 180, 50))
+DIALOG_PORTRAIT_COLOR = (150, 150, 150)
 
-player_config = config["characters"]["player"]
-player = Character(
-    player_config["name"],
-    player_config["image"],
-    player_config["portrait"],
-    player_config["width"],
-    player_config["height"],
-    player_config["hp"],
-    player_config["default_position"],
-    player_config["battle_position"],
-    player_config["placeholder_color"]
-)
+def dialog_portraits(dialogs):
+    return [(entry["portrait"], 100, 100, DIALOG_PORTRAIT_COLOR) for entry in dialogs if "portrait" in entry]
+
+def asset_manifest(game_config):
+    # Chunk backgrounds stream in as the player walks; only the starting chunk is part of the first scene.
+    backgrounds = chunk_backgrounds(settings.world)
+    sprites = [game_config["characters"]["player"]]
+    sprites += world_character_configs(game_config, "enemies") + world_character_configs(game_config, "npcs")
+    
+    explore = [backgrounds[(0, 0)]]
+    explore += [(c["image"], c["width"], c["height"], tuple(c["placeholder_color"])) for c in sprites]
+    dialog = [(c["portrait"], 100, 100, tuple(c["placeholder_color"])) for c in sprites]
+    # Corpus conversations aren't parsed here; DialogSystem loads their portraits when one opens.
+    for character in sprites:
+        dialogs = character_dialogs(character)
+        if not isinstance(dialogs, str):
+            dialog += dialog_portraits(dialogs)
+    return {
+        "explore": list(dict.fromkeys(explore)),
+        "dialog": list(dict.fromkeys(dialog)),
+        "battle": [BATTLE_BACKGROUND_ASSET],
+        "victory": [STICK_OF_TRUTH_ASSET],
+        "world": list(dict.fromkeys(backgrounds.values())),
+    }
+
+def load_assets(progress=None):
+    # Only the first scene blocks startup; the rest streams in behind it.
+    manifest = asset_manifest(config)
+    first = manifest["explore"]
+    if render_scaler.scale != 1.0:
+        # The scene is drawn at the render scale, so the first scene is needed at that size too.
+        first = first + [scaled_asset(asset, render_scaler.scale) for asset in first]
+    asset_loader.load(first, progress)
+    for group in ("battle", "dialog", "victory"):
+        asset_loader.preload(manifest[group])
+    render_scaler.preload()
+
+def draw_loading_screen(done, total):
+    pygame.event.pump()
+    screen.fill(BLACK)
+    bar = pygame.Rect(WIDTH // 4, HEIGHT // 2, WIDTH // 2, 20)
+    pygame.draw.rect(screen, WHITE, bar, 2)
+    if total:
+        pygame.draw.rect(screen, GREEN, (bar.x + 2, bar.y + 2, (bar.width - 4) * done // total, bar.height - 4))
+    loading_text = font.render(f"Loading... {done}/{total}", True, WHITE)
+    screen.blit(loading_text, (WIDTH // 2 - loading_text.get_width() // 2, bar.y - 40))
+    pygame.display.flip()
+
+victory_background = to_display_format(create_placeholder_image(WIDTH, HEIGHT, (20, 20, 50)))
+game_over_background = to_display_format(create_placeholder_image(WIDTH, HEIGHT, (50, 0, 0)))
+HUD_BAR_WIDTH = 150
+HUD_BAR_HEIGHT = 15
+
+def build_victory_layer(background, stick_of_truth):
+    layer = background.copy()
+    layer.blit(stick_of_truth, stick_of_truth.get_rect(center=(WIDTH//2, HEIGHT//2 - 50)))
+    victory_text = render_text(font, "You got the Stick of Truth!", (255, 215, 0))
+    congrats_text = render_text(font, "You are now the ruler of the Kingdom!", (255, 215, 0))
+    layer.blit(victory_text, (WIDTH//2 - victory_text.get_width()//2, HEIGHT//2 + 100))
+    layer.blit(congrats_text, (WIDTH//2 - congrats_text.get_width()//2, HEIGHT//2 + 150))
+    return layer
+
+def build_game_over_layer(background):
+    layer = background.copy()
+    game_over_text = render_text(font, "GAME OVER", RED)
+    restart_text = render_text(font, "Press R to restart", WHITE)
+    layer.blit(game_over_text, (WIDTH//2 - game_over_text.get_width()//2, HEIGHT//2 - 50))
+    layer.blit(restart_text, (WIDTH//2 - restart_text.get_width()//2, HEIGHT//2 + 50))
+    return layer
+
+def build_health_panel(hp, max_hp):
+    layer = pygame.Surface((HUD_BAR_WIDTH + 10, 50))
+    layer.fill(BLACK)
+    pygame.draw.rect(layer, RED, (5, 25, HUD_BAR_WIDTH, HUD_BAR_HEIGHT))
+    pygame.draw.rect(layer, GREEN, (5, 25, (hp / max_hp) * HUD_BAR_WIDTH, HUD_BAR_HEIGHT))
+    pygame.draw.rect(layer, BLACK, (5, 25, HUD_BAR_WIDTH, HUD_BAR_HEIGHT), 2)
+    layer.blit(render_text(small_font, f"HP: {hp}/{max_hp}", WHITE), (5, 5))
+    return layer
+
+def build_stick_icon(stick_of_truth):
+    return pygame.transform.scale(stick_of_truth, (50, 50))
 
-enemies = [Enemy(enemy_config) for enemy_config in config["characters"]["enemies"]]
-npcs = [NPC(npc_config) for npc_config in config["characters"]["npcs"]]
+HEALTH_BAR_WIDTH = 200
+HEALTH_BAR_HEIGHT = 20
+HEALTH_LABEL_HEIGHT = 25
 
-kyle_defeated = False
-victory_timer = 0
+def build_health_bar(name, hp, max_hp):
+    label = render_text(font, f'{name}: {hp}/{max_hp} HP', WHITE)
+    layer = pygame.Surface((max(HEALTH_BAR_WIDTH, label.get_width()), HEALTH_LABEL_HEIGHT + HEALTH_BAR_HEIGHT), pygame.SRCALPHA)
+    # The label sits over the scene, so its pixels are copied (not blended) into the transparent layer.
+    layer.blit(label, (0, 0), special_flags=pygame.BLEND_RGBA_MAX)
+    bar = (0, HEALTH_LABEL_HEIGHT, HEALTH_BAR_WIDTH, HEALTH_BAR_HEIGHT)
+    pygame.draw.rect(layer, RED, bar)
+    pygame.draw.rect(layer, GREEN, (0, HEALTH_LABEL_HEIGHT, (hp / max_hp) * HEALTH_BAR_WIDTH, HEALTH_BAR_HEIGHT))
+    pygame.draw.rect(layer, BLACK, bar, 2)
+    return layer
+
+def build_action_menu(actions, selected_action):
+    layer = pygame.Surface((200, 30 * len(actions) + 20))
+    layer.fill(DIALOG_BG)
+    pygame.draw.rect(layer, WHITE, layer.get_rect(), 2)
+    for i, action in enumerate(actions):
+        layer.blit(render_text(font, action, GREEN if i == selected_action else WHITE), (20, 10 + i * 30))
+    return layer
+
+def build_dialog_box(layouts, current_dialog, portrait):
+    layer = pygame.Surface((WIDTH - 100, 150))
+    layer.fill(DIALOG_BG)
+    pygame.draw.rect(layer, WHITE, layer.get_rect(), 2)
+    text_x = 20
+    if portrait is not None:
+        pygame.draw.rect(layer, (70, 70, 70), (10, 10, 100, 100))
+        layer.blit(portrait, (10, 10))
+        text_x = 130
+    for i, line in enumerate(layouts[current_dialog]):
+        layer.blit(render_text(font, line, WHITE), (text_x, 30 + i * 30))
+    continue_text = render_text(small_font, "Press SPACE to continue...", WHITE)
+    layer.blit(continue_text, (layer.get_width() - continue_text.get_width() - 20, 120))
+    return layer
+
+def build_message_line(message):
+    return render_text(font, message, WHITE)
+
+def build_interaction_hint(name):
+    return render_text(small_font, f"Press SPACE to interact with {name}", WHITE)
+
+player_config = config["characters"]["player"]
 
-current_state = EXPLORE
-dialog_system = DialogSystem()
-battle_system = BattleSystem(player, config["battle"])
-current_interactive = None
 
-MOVEMENT_SPEED = config["game"]["movement_speed"]
-INTERACTION_DISTANCE = config["game"]["interaction_distance"]
-clock = pygame.time.Clock()
+def create_player():
+    return Character(
+        player_config["name"],
+        player_config["image"],
+        player_config["portrait"],
+        player_config["width"],
+        player_config["height"],
+        player_config["hp"],
+        player_config["default_position"],
+        player_config["battle_position"],
+        player_config["placeholder_color"]
+    )
 
-running = True
-while running:
-    for event in pygame.event.get():
+class GameSession:
+    def __init__(self):
+        self.player = create_player()
+        self.enemies, self.npcs = [], []
+        self.sync_characters(self.enemies, world_character_configs(config, "enemies"), Enemy)
+        self.sync_characters(self.npcs, world_character_configs(config, "npcs"), NPC)
+        self.world = ChunkWorld(settings.world)
+        self.world.assign(self.enemies, self.npcs)
+        self.crowd = create_crowd()
+        self.rebuild_spatial_index()
+        
+        self.kyle_defeated = False
+        self.victory_timer = 0
+        
+        self.current_state = EXPLORE
+        self.dialog_system = DialogSystem()
+        self.battle_system = BattleSystem(self.player, settings.battle)
+        self.current_interactive = None
+        self.running = True
+        self.ticks = 0
+        self.state_ticks = 0
+        self.state_started = time.perf_counter()
+        self.hud_panel = Widget(build_health_panel)
+        self.interaction_hint = Widget(build_interaction_hint, "midtop")
+    
+    def rebuild_spatial_index(self):
+        self.spatial_index = SpatialGrid(settings.game.interaction_distance)
+        for character in self.enemies + self.npcs:
+            self.spatial_index.insert(character)
+    
+    def set_npcs(self, npcs):
+        self.npcs = npcs
+        self.world.assign(self.enemies, self.npcs)
+        self.rebuild_spatial_index()
+    
+    def apply_config(self, new_config):
+        # The reloaded action list may be shorter than the one the cursor was on.
+        if self.battle_system.selected_action >= len(self.battle_system.actions):
+            self.battle_system.selected_action = 0
+        self.sync_characters(self.enemies, world_character_configs(new_config, "enemies"), Enemy)
+        self.sync_characters(self.npcs, world_character_configs(new_config, "npcs"), NPC)
+        self.world = ChunkWorld(settings.world)
+        self.world.assign(self.enemies, self.npcs)
+        self.rebuild_spatial_index()
+        # Enemy HP or the battle rules may have changed under the current fight.
+        if self.battle_system.active:
+            self.battle_system.plan()
+    
+    def sync_characters(self, characters, character_configs, character_class):
+        # Keep live state (position, HP, walk cycle) for characters that still exist.
+        existing = {character.key: character for character in characters if character.key is not None}
+        updated = []
+        for character_config, key in zip(character_configs, character_keys(character_configs)):
+            character = existing.get(key)
+            if character is None:
+                character = character_class(character_config)
+                character.key = key
+            else:
+                character.dialogs = character_dialogs(character_config)
+                if "hp" in character_config and character_config["hp"] != character.max_hp:
+                    character.max_hp = character_config["hp"]
+                    character.hp = min(character.hp, character.max_hp)
+            updated.append(character)
+        characters[:] = updated
+    
+    def tick(self, events, keys):
+        previous_state = self.current_state
+        if telemetry is not None:
+            telemetry.tick, telemetry.state = self.ticks, previous_state
+        self.player.save_position()
+        # Only NPCs near the player wander, so last tick's active set is all that can have moved.
+        for npc in self.world.active_npcs:
+            npc.save_position()
+        # The hit shake counts down in ticks, not frames, so replays don't depend on the frame rate.
+        for character in [self.player] + self.enemies:
+            if character.animation_frame > 0:
+                character.animation_frame -= 1
+        for event in events:
+            self.handle_event(event)
+        self.update(keys)
+        self.ticks += 1
+        self.state_ticks += 1
+        if self.current_state != previous_state:
+            self.record_state_time(previous_state, STATE_NAMES[self.current_state])
+    
+    def record_state_time(self, state, to):
+        # One record per visit to a state: where it went next and the ticks and wall time spent in it.
+        if telemetry is not None:
+            telemetry.state = state
+            telemetry.record("state", to, "", self.state_ticks, int((time.perf_counter() - self.state_started) * 1000))
+        self.state_ticks = 0
+        self.state_started = time.perf_counter()
+    
+    def finish(self):
+        self.record_state_time(self.current_state, "END")
+    
+    def apply_battle_result(self, result):
+        if result == "lose":
+            self.current_state = GAME_OVER
+        elif result == "run" or result == "win":
+            self.current_state = EXPLORE
+        elif result == "kyle_defeated":
+            self.current_state = VICTORY
+            self.victory_timer = 180
+            self.kyle_defeated = True
+    
+    def handle_event(self, event):
         if event.type == pygame.QUIT:
-            running = False
-        
-        if event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_SPACE:
-                if current_state == BATTLE:
-                    if not battle_system.player_turn and battle_system.enemy_attack_pending:
-                        battle_system.activate_block()
-                elif current_state == DIALOG:
-                    if not dialog_system.next_dialog():
-                        if isinstance(current_interactive, Enemy):
-                            current_state = BATTLE
-                            battle_system.start_battle(current_interactive)
-                        else:
-                            current_state = EXPLORE
-                elif current_state == EXPLORE:
-                    for character in enemies + npcs:
-                        if isinstance(character, Enemy) and character.is_dead:
-                            continue
-                        if abs(player.x - character.x) < INTERACTION_DISTANCE:
-                            current_interactive = character
-                            if character.dialogs:
-                                current_state = DIALOG
-                                dialog_system.start_dialog(character.dialogs)
-                                break
-                            elif isinstance(character, Enemy):
-                                current_state = BATTLE
-                                battle_system.start_battle(character)
-                                break
-            
-            elif current_state == BATTLE:
-                if battle_system.player_turn and not battle_system.enemy_attack_pending:
-                    if event.key == pygame.K_w:
-                        battle_system.select_action(-1)
-                    elif event.key == pygame.K_s:
-                        battle_system.select_action(1)
-                    elif event.key == pygame.K_RETURN:
-                        result = battle_system.execute_action()
-                        if result == "run":
-                            current_state = EXPLORE
-                        elif result == "win":
-                            current_state = EXPLORE
-                        elif result == "kyle_defeated":
-                            current_state = VICTORY
-                            victory_timer = 180
-                            kyle_defeated = True
-                        elif result == "lose":
-                            current_state = GAME_OVER
-            
-            elif current_state == GAME_OVER:
-                if event.key == pygame.K_r:
-                    player.hp = player.max_hp
-                    player.is_dead = False
-                    for enemy in enemies:
-                        enemy.hp = enemy.max_hp
-                        enemy.is_dead = False
-                    current_state = EXPLORE
-                    player.x, player.y = player_config["default_position"]
+            self.running = False
+        
+        if event.type != pygame.KEYDOWN:
+            return
+        
+        player = self.player
+        battle_system = self.battle_system
+        if event.key == pygame.K_SPACE:
+            if self.current_state == BATTLE:
+                if not battle_system.player_turn and battle_system.enemy_attack_pending:
+                    battle_system.activate_block()
+            elif self.current_state == DIALOG:
+                if not self.dialog_system.next_dialog():
+                    if isinstance(self.current_interactive, Enemy):
+                        self.current_state = BATTLE
+                        battle_system.start_battle(self.current_interactive)
+                    else:
+                        self.current_state = EXPLORE
+            elif self.current_state == EXPLORE:
+                character = self.nearest_interactable()
+                if character is not None:
+                    self.current_interactive = character
+                    dialogs = resolve_dialogs(character.dialogs)
+                    if dialogs:
+                        self.current_state = DIALOG
+                        self.dialog_system.start_dialog(dialogs)
+                    elif isinstance(character, Enemy):
+                        self.current_state = BATTLE
+                        battle_system.start_battle(character)
+        
+        elif self.current_state == BATTLE:
+            if battle_system.player_turn and not battle_system.enemy_attack_pending:
+                if event.key == pygame.K_w:
+                    battle_system.select_action(-1)
+                elif event.key == pygame.K_s:
+                    battle_system.select_action(1)
+                elif event.key == pygame.K_RETURN:
+                    self.apply_battle_result(battle_system.execute_action())
+                elif event.key == pygame.K_TAB:
+                    action = battle_system.auto_action()
+                    if action in battle_system.actions:
+                        battle_system.selected_action = battle_system.actions.index(action)
+                        self.apply_battle_result(battle_system.execute_action())
+        
+        elif self.current_state == GAME_OVER:
+            if event.key == pygame.K_r:
+                player.hp = player.max_hp
+                player.is_dead = False
+                for enemy in self.enemies:
+                    enemy.hp = enemy.max_hp
+                    enemy.is_dead = False
+                self.current_state = EXPLORE
+                player.x, player.y = player_config["default_position"]
+                player.save_position()
     
-    screen.fill(BLACK)
-    screen.blit(background, (0, 0))
+    def update(self, keys):
+        if self.current_state == EXPLORE:
+            self.move_player(keys)
+            player = self.player
+            for npc in self.world.npcs_near(player.x + player.width / 2, player.y + player.height / 2):
+                npc.wander()
+                self.spatial_index.update(npc)
+            if self.crowd is not None:
+                self.crowd.step()
+        
+        elif self.current_state == BATTLE:
+            self.apply_battle_result(self.battle_system.update())
+        
+        elif self.current_state == VICTORY:
+            self.victory_timer -= 1
+            if self.victory_timer <= 0:
+                self.current_state = EXPLORE
     
-    if current_state == EXPLORE:
-        keys = pygame.key.get_pressed()
+    def is_static(self):
+        # Nothing changes until the next input: ticks would be no-ops and every frame the same.
+        if any(character.animation_frame > 0 for character in [self.player] + self.enemies):
+            return False
+        if self.current_state in (DIALOG, GAME_OVER):
+            return True
+        return self.current_state == BATTLE and not self.battle_system.enemy_attack_pending
+    
+    def move_player(self, keys):
+        player = self.player
+        bounds = self.world.bounds
+        start = (player.x, player.y)
         moved = False
         
-        if keys[pygame.K_a] and player.x > 0:
-            player.x -= MOVEMENT_SPEED
+        if keys[pygame.K_a] and player.x > bounds.left:
+            player.x -= settings.game.movement_speed
             player.walking = True
             player.rotate("left")
             moved = True
-        if keys[pygame.K_d] and player.x < WIDTH - player.width:
-            player.x += MOVEMENT_SPEED
+        if keys[pygame.K_d] and player.x < bounds.right - player.width:
+            player.x += settings.game.movement_speed
             player.walking = True
             player.rotate("right")
             moved = True
-        if keys[pygame.K_w] and player.y > 200:
-            player.y -= MOVEMENT_SPEED
+        if keys[pygame.K_w] and player.y > bounds.top + 200:
+            player.y -= settings.game.movement_speed
             player.walking = True
             player.rotate("up")
             moved = True
-        if keys[pygame.K_s] and player.y < HEIGHT - player.height:
-            player.y += MOVEMENT_SPEED
+        if keys[pygame.K_s] and player.y < bounds.bottom - player.height:
+            player.y += settings.game.movement_speed
             player.walking = True
             player.rotate("down")
             moved = True
+        if moved and not self.world.contains(player.x + player.width / 2, player.y + player.height / 2):
+            # Gaps in the chunk grid are walls.
+            player.x, player.y = start
             
         if not moved:
             player.walking = False
             player.direction = 0
-            player.img = player.original_img.copy()
-        
-        player.draw(screen)
-        for enemy in enemies:
-            if not enemy.is_dead:
-                enemy.draw(screen)
-        for npc in npcs:
-            npc.wander()
-            npc.draw(screen)
-    
-    elif current_state == DIALOG:
-        player.draw(screen)
-        current_interactive.draw(screen)
-        dialog_system.draw(screen)
-    
-    elif current_state == BATTLE:
-        result = battle_system.update()
-        if result == "lose":
-            current_state = GAME_OVER
-        elif result == "run" or result == "win":
-            current_state = EXPLORE
-        elif result == "kyle_defeated":
-            current_state = VICTORY
-            victory_timer = 180
-            kyle_defeated = True
+            player.img = player.original_img
+    
+    def nearest_interactable(self):
+        player = self.player
+        return self.spatial_index.nearest(
+            player.x + player.width / 2,
+            player.y + player.height / 2,
+            settings.game.interaction_distance,
+            is_interactable
+        )
+    
+    def camera(self, alpha=1.0):
+        x, y = self.player.interpolated_position(alpha)
+        return self.world.camera(x + self.player.width / 2, y + self.player.height / 2)
+    
+    def background(self, camera, scale=1.0):
+        if self.current_state == BATTLE:
+            return get_image(*scaled_asset(BATTLE_BACKGROUND_ASSET, scale))
+        # The end screens are completely static, so their text is baked into the background.
+        if self.current_state == VICTORY:
+            return layer_cache.get("victory", (victory_background, get_image(*STICK_OF_TRUTH_ASSET)), build_victory_layer)
+        if self.current_state == GAME_OVER:
+            return layer_cache.get("game_over", (game_over_background,), build_game_over_layer)
+        self.world.stream(camera, scale)
+        return self.world.view(camera, scale)
+    
+    def draw(self, surface, alpha=1.0):
+        camera = self.camera(alpha)
+        # The end screens are one baked layer each, so only the live scenes are drawn scaled down.
+        scale = render_scaler.scale if self.current_state in (EXPLORE, DIALOG, BATTLE) else 1.0
+        if scale != 1.0:
+            scene = render_scaler.begin()
+            scene.blit(self.background(camera, scale), (0, 0))
+            self.draw_scene(scene, camera, alpha, scale)
+            render_scaler.present(surface)
+            if dirty_renderer is not None:
+                # The upscaled scene covers the whole window every frame.
+                dirty_renderer.invalidate()
+        else:
+            if dirty_renderer is not None:
+                dirty_renderer.begin(surface, self.background(camera))
+            else:
+                surface.fill(BLACK)
+                surface.blit(self.background(camera), (0, 0))
+            self.draw_scene(surface, camera, alpha)
         
-        battle_system.draw(screen)
+        if self.current_state == EXPLORE:
+            self.draw_hud(surface)
+        elif self.current_state == DIALOG:
+            self.dialog_system.draw(surface)
+        elif self.current_state == BATTLE:
+            self.battle_system.draw(surface)
     
-    elif current_state == VICTORY:
-        pygame.draw.rect(screen, (20, 20, 50), (0, 0, WIDTH, HEIGHT))
+    def draw_scene(self, surface, camera, alpha, scale=1.0):
+        player = self.player
+        if self.current_state == EXPLORE:
+            x, y = player.interpolated_position(alpha)
+            player.draw(surface, x - camera.x, y - camera.y, scale)
+            chunks = self.world.visible(camera.inflate(self.world.margin * 2, self.world.margin * 2))
+            for chunk in chunks:
+                for enemy in chunk.enemies:
+                    if not enemy.is_dead and camera.colliderect(enemy.x, enemy.y, enemy.width, enemy.height):
+                        enemy.draw(surface, enemy.x - camera.x, enemy.y - camera.y, scale)
+            if self.crowd is not None:
+                self.crowd.draw(surface, -camera.x, -camera.y, scale)
+            for chunk in chunks:
+                for npc in chunk.npcs:
+                    if camera.colliderect(npc.x, npc.y, npc.width, npc.height):
+                        x, y = npc.interpolated_position(alpha)
+                        npc.draw(surface, x - camera.x, y - camera.y, scale)
         
-        stick_rect = stick_of_truth.get_rect(center=(WIDTH//2, HEIGHT//2 - 50))
-        screen.blit(stick_of_truth, stick_rect)
+        elif self.current_state == DIALOG:
+            interactive = self.current_interactive
+            player.draw(surface, player.x - camera.x, player.y - camera.y, scale)
+            interactive.draw(surface, interactive.x - camera.x, interactive.y - camera.y, scale)
         
-        victory_text = font.render("You got the Stick of Truth!", True, (255, 215, 0))
-        congrats_text = font.render("You are now the ruler of the Kingdom!", True, (255, 215, 0))
+        elif self.current_state == BATTLE:
+            self.battle_system.draw_scene(surface, scale)
+    
+    def draw_hud(self, surface):
+        player = self.player
+        self.hud_panel.draw(surface, (10, 10), player.hp, player.max_hp)
         
-        screen.blit(victory_text, (WIDTH//2 - victory_text.get_width()//2, HEIGHT//2 + 100))
-        screen.blit(congrats_text, (WIDTH//2 - congrats_text.get_width()//2, HEIGHT//2 + 150))
+        character = self.nearest_interactable()
+        if character is not None:
+            self.interaction_hint.draw(surface, (WIDTH//2, HEIGHT - 50), character.name)
         
-        victory_timer -= 1
-        if victory_timer <= 0:
-            current_state = EXPLORE
+        if self.kyle_defeated:
+            stick_icon = layer_cache.get("stick_icon", (get_image(*STICK_OF_TRUTH_ASSET),), build_stick_icon)
+            mark_dirty(surface.blit(stick_icon, (WIDTH - 60, 10)))
+            stick_text = render_text(small_font, "Stick of Truth", (255, 215, 0))
+            mark_dirty(surface.blit(stick_text, (WIDTH - 130, 60)))
+    
+    def summary(self):
+        return {
+            "ticks": self.ticks,
+            "state": STATE_NAMES[self.current_state],
+            "kyle_defeated": self.kyle_defeated,
+            "player_hp": self.player.hp,
+            "enemies_hp": {enemy.name: enemy.hp for enemy in self.enemies},
+        }
     
-    elif current_state == GAME_OVER:
-        screen.fill((50, 0, 0))
+    def snapshot(self):
+        return capture_state(self)
+    
+    def restore(self, state):
+        restore_state(self, *state)
+
+SNAPSHOT_MAGIC = b"SOTS"
+SNAPSHOT_VERSION = 1
+FULL_SNAPSHOT, DELTA_SNAPSHOT = 0, 1
+SNAPSHOT_HEADER = struct.Struct("<4sBBHHI")
+RECORD_LENGTH = struct.Struct("<I")
+BATTLE_RESULTS = (None, "run", "win", "kyle_defeated", "lose")
+DIRECTIONS = ("left", "right", "up", "down")
+SESSION_WORDS = 18
+CHARACTER_WORDS = 10
+NPC_WORDS = CHARACTER_WORDS + 2
+# The Mersenne Twister's key words plus its position; the version word is counted separately.
+RNG_WORDS = len(random.getstate()[1])
+
+def to_word(value):
+    return int(value) & 0xFFFFFFFF
+
+def from_word(value):
+    return value - (1 << 32) if value & 0x80000000 else value
+
+def character_words(character):
+    return [
+        character.hp, character.max_hp, character.is_dead, character.x, character.y,
+        character.direction, character.walk_cycle, character.walk_timer, character.walking,
+        character.animation_frame
+    ]
+
+def restore_character(character, values):
+    (character.hp, character.max_hp, is_dead, character.x, character.y, character.direction,
+     character.walk_cycle, character.walk_timer, walking, character.animation_frame) = values
+    character.is_dead, character.walking = bool(is_dead), bool(walking)
+    character.img = character.frames.get(character.direction, character.original_img)
+    character.save_position()
+
+def entity_index(entity, entities):
+    for i, candidate in enumerate(entities):
+        if candidate is entity:
+            return i
+    return -1
+
+def capture_state(session):
+    # Everything with a fixed size goes into 32-bit words so deltas are a plain
+    # index/value diff; variable-length data goes into the tail bytes.
+    battle = session.battle_system
+    dialog = session.dialog_system
+    interactives = session.enemies + session.npcs
+    values = [
+        session.current_state, session.kyle_defeated, session.victory_timer, session.ticks,
+        entity_index(session.current_interactive, interactives),
+        entity_index(battle.enemy, session.enemies), battle.player_turn, battle.selected_action,
+        battle.active, battle.animation_timer, battle.enemy_attack_pending,
+        BATTLE_RESULTS.index(battle.battle_result), battle.block_active, battle.block_prompt_visible,
+        battle.block_prompt_timer, battle.block_window_timer,
+        dialog.active, dialog.current_dialog,
+    ]
+    values += character_words(session.player)
+    for enemy in session.enemies:
+        values += character_words(enemy)
+    for npc in session.npcs:
+        values += character_words(npc) + [npc.movement_timer, DIRECTIONS.index(npc.move_direction)]
+    
+    rng_version, rng_words, gauss_next = random.getstate()
+    words = array('I', map(to_word, values))
+    words.append(rng_version)
+    words.extend(rng_words)
+    
+    message = battle.message.encode("utf-8")
+    tail = [struct.pack("<I", len(message)), message, struct.pack("<?d", gauss_next is not None, gauss_next or 0.0)]
+    if session.crowd is not None:
+        tail.append(session.crowd.state_bytes())
+    return words, b"".join(tail)
+
+def restore_state(session, words, tail):
+    expected = SESSION_WORDS + CHARACTER_WORDS * (1 + len(session.enemies)) + NPC_WORDS * len(session.npcs) + 1 + RNG_WORDS
+    if len(words) != expected:
+        raise ValueError("Snapshot does not match the current set of characters")
+    values = [from_word(word) for word in words]
+    (state, kyle_defeated, victory_timer, ticks, interactive, battle_enemy, player_turn, selected_action,
+     battle_active, animation_timer, attack_pending, battle_result, block_active, block_prompt_visible,
+     block_prompt_timer, block_window_timer, dialog_active, current_dialog) = values[:SESSION_WORDS]
+    
+    session.current_state, session.kyle_defeated = state, bool(kyle_defeated)
+    session.victory_timer, session.ticks = victory_timer, ticks
+    interactives = session.enemies + session.npcs
+    session.current_interactive = interactives[interactive] if interactive >= 0 else None
+    
+    position = SESSION_WORDS
+    restore_character(session.player, values[position:position + CHARACTER_WORDS])
+    position += CHARACTER_WORDS
+    for enemy in session.enemies:
+        restore_character(enemy, values[position:position + CHARACTER_WORDS])
+        position += CHARACTER_WORDS
+    for npc in session.npcs:
+        restore_character(npc, values[position:position + CHARACTER_WORDS])
+        npc.movement_timer = values[position + CHARACTER_WORDS]
+        npc.move_direction = DIRECTIONS[values[position + CHARACTER_WORDS + 1]]
+        position += NPC_WORDS
+    session.rebuild_spatial_index()
+    
+    battle = session.battle_system
+    battle.enemy = session.enemies[battle_enemy] if battle_enemy >= 0 else None
+    battle.player_turn, battle.selected_action = bool(player_turn), selected_action
+    battle.active, battle.animation_timer = bool(battle_active), animation_timer
+    battle.enemy_attack_pending = bool(attack_pending)
+    battle.battle_result = BATTLE_RESULTS[battle_result]
+    battle.block_active, battle.block_prompt_visible = bool(block_active), bool(block_prompt_visible)
+    battle.block_prompt_timer, battle.block_window_timer = block_prompt_timer, block_window_timer
+    
+    dialog = session.dialog_system
+    if dialog_active and session.current_interactive is not None:
+        dialog.start_dialog(resolve_dialogs(session.current_interactive.dialogs))
+    dialog.current_dialog, dialog.active = current_dialog, bool(dialog_active)
+    
+    message_length = struct.unpack_from("<I", tail, 0)[0]
+    battle.message = tail[4:4 + message_length].decode("utf-8")
+    has_gauss, gauss_next = struct.unpack_from("<?d", tail, 4 + message_length)
+    random.setstate((words[position], tuple(words[position + 1:]), gauss_next if has_gauss else None))
+    crowd_offset = 4 + message_length + struct.calcsize("<?d")
+    if session.crowd is not None and len(tail) > crowd_offset:
+        session.crowd.load_state_bytes(tail[crowd_offset:])
+
+def encode_snapshot(session, state, previous=None):
+    words, tail = state
+    if previous is None or len(previous[0]) != len(words):
+        header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, FULL_SNAPSHOT,
+                                      len(session.enemies), len(session.npcs), len(words))
+        return b"".join((header, words.tobytes(), RECORD_LENGTH.pack(len(tail)), tail))
+    
+    previous_words, previous_tail = previous
+    changed = array('I', [i for i, (old, new) in enumerate(zip(previous_words, words)) if old != new])
+    changed_values = array('I', [words[i] for i in changed])
+    header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, DELTA_SNAPSHOT,
+                                  len(session.enemies), len(session.npcs), len(changed))
+    # An unchanged tail is stored as length 0xFFFFFFFF.
+    tail_record = RECORD_LENGTH.pack(0xFFFFFFFF) if tail == previous_tail else RECORD_LENGTH.pack(len(tail)) + tail
+    return b"".join((header, changed.tobytes(), changed_values.tobytes(), tail_record))
+
+def decode_snapshot(data, previous=None):
+    magic, version, kind, _, _, count = SNAPSHOT_HEADER.unpack_from(data, 0)
+    if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+        raise ValueError("Not a save state")
+    position = SNAPSHOT_HEADER.size
+    
+    if kind == FULL_SNAPSHOT:
+        words = array('I')
+        words.frombytes(data[position:position + count * 4])
+        position += count * 4
+    else:
+        if previous is None:
+            raise ValueError("Delta snapshot without a previous snapshot")
+        words = array('I', previous[0])
+        indices, values = array('I'), array('I')
+        indices.frombytes(data[position:position + count * 4])
+        values.frombytes(data[position + count * 4:position + count * 8])
+        position += count * 8
+        for index, value in zip(indices, values):
+            words[index] = value
+    
+    tail_length = RECORD_LENGTH.unpack_from(data, position)[0]
+    position += RECORD_LENGTH.size
+    if tail_length == 0xFFFFFFFF:
+        tail = previous[1]
+    else:
+        tail = bytes(data[position:position + tail_length])
+    return words, tail
+
+def read_snapshots(path):
+    # A save file is a full snapshot followed by deltas, each length-prefixed.
+    with open(path, 'rb') as f:
+        data = f.read()
+    state, position = None, 0
+    while position + RECORD_LENGTH.size <= len(data):
+        length = RECORD_LENGTH.unpack_from(data, position)[0]
+        position += RECORD_LENGTH.size
+        if position + length > len(data):
+            break
+        state = decode_snapshot(memoryview(data)[position:position + length], state)
+        position += length
+    if state is None:
+        raise ValueError(f"{path} has no snapshots")
+    return state
+
+def write_save_file(path, record):
+    temporary = path + ".tmp"
+    with open(temporary, 'wb') as f:
+        f.write(RECORD_LENGTH.pack(len(record)) + record)
+    os.replace(temporary, path)
+
+def save_game(path, session):
+    write_save_file(path, encode_snapshot(session, session.snapshot()))
+
+def load_game(path, session):
+    session.restore(read_snapshots(path))
+
+class Autosaver:
+    def __init__(self, path, interval_ticks, keyframe_every=20):
+        self.path = path
+        self.interval_ticks = max(1, interval_ticks)
+        self.keyframe_every = keyframe_every
+        self.previous = None
+        self.saves = 0
+        self.file = None
+    
+    def update(self, session):
+        if session.ticks % self.interval_ticks:
+            return
+        state = session.snapshot()
+        if self.file is None or self.saves % self.keyframe_every == 0:
+            # Start a new file with a full snapshot, then append deltas to it.
+            self.close()
+            write_save_file(self.path, encode_snapshot(session, state))
+            self.file = open(self.path, 'ab')
+        else:
+            record = encode_snapshot(session, state, self.previous)
+            self.file.write(RECORD_LENGTH.pack(len(record)) + record)
+            self.file.flush()
+        self.previous = state
+        self.saves += 1
+    
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+TELEMETRY_MAGIC = b"SOTTELEM"
+TELEMETRY_VERSION = 1
+TELEMETRY_HEADER = struct.Struct("<8sII")
+# seconds since start, tick, event, state, subject and detail (interned names), value, extra
+TELEMETRY_RECORD = struct.Struct("<dIBBHHii")
+# Binary files are a header, then one block per flush: record count, first new name, names JSON length,
+# dropped so far, the names interned since the previous block, then the records.
+TELEMETRY_BLOCK = struct.Struct("<IIII")
+# Per event: name, then the JSON field names for subject, detail, value and extra (None = unused).
+TELEMETRY_EVENTS = (
+    ("action", "action", "result", "amount", None),
+    ("damage", "target", "source", "amount", "blocked"),
+    ("block", "enemy", None, "accepted", None),
+    ("state", "to", None, "ticks", "ms"),
+)
+TELEMETRY_EVENT_IDS = {event[0]: i for i, event in enumerate(TELEMETRY_EVENTS)}
+
+class Telemetry:
+    # The frame loop only packs fixed-size records into a preallocated ring buffer; a background thread
+    # drains it in batches to rotating gzip files. When the writer falls behind, new records are dropped
+    # and counted instead of growing the buffer.
+    def __init__(self, directory, file_format="jsonl", buffer_kb=1024, flush_seconds=2.0, max_file_mb=8, max_files=20):
+        if file_format not in ("jsonl", "binary"):
+            raise ValueError(f"telemetry: unknown format {file_format!r}, expected jsonl or binary")
+        self.capacity = max(1, buffer_kb * 1024 // TELEMETRY_RECORD.size)
+        self.buffer = bytearray(self.capacity * TELEMETRY_RECORD.size)
+        self.head = 0
+        self.count = 0
+        self.dropped = 0
+        self.written = 0
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.running = True
+        # Names are interned on the main thread; the list only ever grows, so the writer can read it freely.
+        self.names = [""]
+        self.name_ids = {"": 0}
+        self.tick = 0
+        self.state = 0
+        self.started = time.time()
+        self.start = time.perf_counter()
+        self.writer = TelemetryWriter(directory, file_format, int(max_file_mb * 1024 * 1024), max_files, self.started)
+        self.flush_seconds = flush_seconds
+        self.thread = threading.Thread(target=self.run, name="telemetry", daemon=True)
+        self.thread.start()
+    
+    def name_id(self, name):
+        name_id = self.name_ids.get(name)
+        if name_id is None:
+            name_id = self.name_ids[name] = len(self.names)
+            self.names.append(name)
+        return name_id
+    
+    def record(self, event, subject="", detail="", value=0, extra=0):
+        record_id = TELEMETRY_EVENT_IDS[event]
+        subject_id, detail_id = self.name_id(subject), self.name_id(detail)
+        seconds = time.perf_counter() - self.start
+        with self.lock:
+            if self.count == self.capacity:
+                self.dropped += 1
+                return
+            TELEMETRY_RECORD.pack_into(self.buffer, self.head * TELEMETRY_RECORD.size,
+                                       seconds, self.tick, record_id, self.state, subject_id, detail_id, value, extra)
+            self.head = (self.head + 1) % self.capacity
+            self.count += 1
+            half_full = self.count * 2 >= self.capacity
+        if half_full:
+            self.wake.set()
+    
+    def drain(self):
+        size = TELEMETRY_RECORD.size
+        with self.lock:
+            tail = (self.head - self.count) % self.capacity
+            end = tail + self.count
+            if end <= self.capacity:
+                data = bytes(self.buffer[tail * size:end * size])
+            else:
+                data = bytes(self.buffer[tail * size:]) + bytes(self.buffer[:(end - self.capacity) * size])
+            self.count = 0
+            dropped = self.dropped
+        return data, dropped
+    
+    def run(self):
+        while self.running:
+            self.wake.wait(self.flush_seconds)
+            self.wake.clear()
+            try:
+                self.flush()
+            except OSError as error:
+                # Stop writing; from here on the buffer fills up and records are counted as dropped.
+                print(f"Telemetry stopped: {error}")
+                return
+    
+    def flush(self):
+        data, dropped = self.drain()
+        if data or dropped != self.writer.dropped:
+            self.writer.write(data, self.names, dropped)
+            self.written += len(data) // TELEMETRY_RECORD.size
+    
+    def close(self):
+        alive = self.thread.is_alive()
+        self.running = False
+        self.wake.set()
+        self.thread.join()
+        if alive:
+            self.flush()
+        self.writer.close()
+    
+    def stats(self):
+        return {"written": self.written, "dropped": self.dropped, "buffered": self.count, "capacity": self.capacity}
+
+class TelemetryWriter:
+    # Runs on the telemetry thread only. Every file stands alone: binary files repeat the names they use.
+    def __init__(self, directory, file_format, max_file_bytes, max_files, started):
+        self.directory = directory
+        self.file_format = file_format
+        self.max_file_bytes = max(1, max_file_bytes)
+        self.max_files = max(1, max_files)
+        self.started = started
+        self.prefix = "telemetry-" + time.strftime("%Y%m%d-%H%M%S", time.localtime(started))
+        self.extension = ".jsonl.gz" if file_format == "jsonl" else ".bin.gz"
+        self.sequence = 0
+        self.file = None
+        self.file_bytes = 0
+        self.file_names = 0
+        self.dropped = 0
+    
+    def open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{self.prefix}-{self.sequence:04d}{self.extension}")
+        self.sequence += 1
+        self.file = gzip.open(path, 'wb', compresslevel=5)
+        self.file_names = 0
+        if self.file_format == "jsonl":
+            header = json.dumps({"event": "telemetry", "version": TELEMETRY_VERSION, "started": self.started}) + "\n"
+            self.file.write(header.encode("utf-8"))
+            self.file_bytes = len(header)
+        else:
+            header = json.dumps({
+                "started": self.started,
+                "record": TELEMETRY_RECORD.format,
+                "events": TELEMETRY_EVENTS,
+                "states": STATE_NAMES,
+            }).encode("utf-8")
+            self.file.write(TELEMETRY_HEADER.pack(TELEMETRY_MAGIC, TELEMETRY_VERSION, len(header)) + header)
+            self.file_bytes = TELEMETRY_HEADER.size + len(header)
+        # Keep only the newest files.
+        existing = sorted(glob.glob(os.path.join(self.directory, "telemetry-*" + self.extension)))
+        for old in existing[:-self.max_files]:
+            os.remove(old)
+    
+    def write(self, data, names, dropped):
+        if self.file is None:
+            self.open()
+        if self.file_format == "jsonl":
+            lines = []
+            if dropped != self.dropped:
+                lines.append(json.dumps({"event": "dropped", "count": dropped - self.dropped, "total": dropped}))
+            for record in TELEMETRY_RECORD.iter_unpack(data):
+                lines.append(json.dumps(telemetry_entry(record, names, TELEMETRY_EVENTS, STATE_NAMES)))
+            chunk = ("\n".join(lines) + "\n").encode("utf-8")
+        else:
+            known = len(names)
+            new_names = json.dumps(names[self.file_names:known]).encode("utf-8")
+            chunk = TELEMETRY_BLOCK.pack(len(data) // TELEMETRY_RECORD.size, self.file_names, len(new_names), dropped) + new_names + data
+            self.file_names = known
+        self.file.write(chunk)
+        self.file.flush()
+        self.dropped = dropped
+        self.file_bytes += len(chunk)
+        if self.file_bytes >= self.max_file_bytes:
+            self.close()
+    
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+def telemetry_entry(record, names, events, states):
+    seconds, tick, event, state, subject, detail, value, extra = record
+    name, *fields = events[event]
+    entry = {"t": round(seconds, 4), "tick": tick, "event": name, "state": states.get(state)}
+    for field, field_value in zip(fields, (names[subject], names[detail], value, extra)):
+        if field is not None:
+            entry[field] = field_value
+    return entry
+
+def read_telemetry(path):
+    # Yields the same dicts for both formats, so analysis scripts don't care which one was written.
+    with gzip.open(path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(TELEMETRY_MAGIC):
+        for line in data.decode("utf-8").splitlines():
+            if line:
+                yield json.loads(line)
+        return
+    
+    magic, version, header_length = TELEMETRY_HEADER.unpack_from(data, 0)
+    if version != TELEMETRY_VERSION:
+        raise ValueError(f"{path} is telemetry version {version}, expected {TELEMETRY_VERSION}")
+    header = json.loads(data[TELEMETRY_HEADER.size:TELEMETRY_HEADER.size + header_length])
+    yield {"event": "telemetry", "version": version, "started": header["started"]}
+    states = {int(state): name for state, name in header["states"].items()}
+    names, dropped = [], 0
+    offset = TELEMETRY_HEADER.size + header_length
+    while offset < len(data):
+        count, first_name, names_length, total_dropped = TELEMETRY_BLOCK.unpack_from(data, offset)
+        offset += TELEMETRY_BLOCK.size
+        del names[first_name:]
+        names += json.loads(data[offset:offset + names_length])
+        offset += names_length
+        if total_dropped != dropped:
+            yield {"event": "dropped", "count": total_dropped - dropped, "total": total_dropped}
+            dropped = total_dropped
+        for record in TELEMETRY_RECORD.iter_unpack(data[offset:offset + count * TELEMETRY_RECORD.size]):
+            yield telemetry_entry(record, names, header["events"], states)
+        offset += count * TELEMETRY_RECORD.size
+
+def open_telemetry(telemetry_config):
+    if not telemetry_config.get("enabled", False):
+        return None
+    return Telemetry(
+        telemetry_config.get("directory", "telemetry"),
+        telemetry_config.get("format", "jsonl"),
+        telemetry_config.get("buffer_kb", 1024),
+        telemetry_config.get("flush_seconds", 2.0),
+        telemetry_config.get("max_file_mb", 8),
+        telemetry_config.get("max_files", 20),
+    )
+
+telemetry = open_telemetry(TELEMETRY)
+
+class FramePacer:
+    # Full frame rate while anything moves. Once the session has been static for idle_after seconds,
+    # frames block in pygame.event.wait for up to 1 / idle_frame_rate, and while the window is minimized
+    # or unfocused they are capped at background_frame_rate. Any input snaps back to full rate.
+    def __init__(self, idle_after, idle_frame_rate, background_frame_rate, adaptive=True):
+        self.clock = pygame.time.Clock()
+        self.idle_after = idle_after
+        self.idle_frame_rate = idle_frame_rate
+        self.background_frame_rate = background_frame_rate
+        self.adaptive = adaptive
+        self.static_since = None
+        self.woken_by = None
+        self.mode = "full"
+        self.start = self.window_start = time.perf_counter()
+        self.start_cpu = self.window_cpu = time.process_time()
+        self.frames = 0
+        self.window_frames = 0
+        self.fps = 0.0
+        # CPU seconds spent per wall-clock second, across all of the process's threads.
+        self.cpu_per_second = 0.0
+    
+    def measure(self, now):
+        self.frames += 1
+        self.window_frames += 1
+        elapsed = now - self.window_start
+        if elapsed >= 1.0:
+            cpu = time.process_time()
+            self.fps = self.window_frames / elapsed
+            self.cpu_per_second = (cpu - self.window_cpu) / elapsed
+            self.window_frames, self.window_start, self.window_cpu = 0, now, cpu
+    
+    def events(self):
+        # The event that ended an idle wait comes first; it left the queue before everything else.
+        events = pygame.event.get()
+        if self.woken_by is not None:
+            events.insert(0, self.woken_by)
+            self.woken_by = None
+        return events
+    
+    def pace(self, session):
+        # Returns True after waiting for input, so the caller can drop the idle time from the simulation.
+        now = time.perf_counter()
+        self.measure(now)
+        if not self.adaptive:
+            self.clock.tick(settings.game.frame_rate)
+            return False
         
-        game_over_text = font.render("GAME OVER", True, RED)
-        restart_text = font.render("Press R to restart", True, WHITE)
+        if not session.is_static():
+            self.static_since = None
+        elif self.static_since is None:
+            self.static_since = now
+        if self.static_since is not None and now - self.static_since >= self.idle_after:
+            self.mode = "idle"
+            event = pygame.event.wait(int(1000 / self.idle_frame_rate))
+            if event.type != pygame.NOEVENT:
+                # Kept aside rather than re-posted, which would put it behind anything queued since.
+                self.woken_by = event
+                self.static_since = None
+            self.clock.tick()
+            return True
         
-        screen.blit(game_over_text, (WIDTH//2 - game_over_text.get_width()//2, HEIGHT//2 - 50))
-        screen.blit(restart_text, (WIDTH//2 - restart_text.get_width()//2, HEIGHT//2 + 50))
+        if not pygame.display.get_active() or not pygame.key.get_focused():
+            self.mode = "background"
+            self.clock.tick(self.background_frame_rate)
+        else:
+            self.mode = "full"
+            self.clock.tick(settings.game.frame_rate)
+        return False
+    
+    def status(self):
+        return f"{self.mode}: {self.fps:.0f} FPS, CPU {self.cpu_per_second * 100:.0f}%"
+    
+    def summary(self):
+        elapsed = max(time.perf_counter() - self.start, 1e-9)
+        return {"fps": self.frames / elapsed, "cpu_per_second": (time.process_time() - self.start_cpu) / elapsed}
+
+def run(load_path=None, record_path=None, replay=None):
+    load_assets(draw_loading_screen)
+    recorder = None
+    if replay is not None:
+        random.seed(replay.seed)
+    elif record_path:
+        recorder = ReplayRecorder(record_path, random.getrandbits(63))
+        random.seed(recorder.seed)
+    session = GameSession()
+    # A replay feeds input that pygame.event.wait can't see, so it always runs at full rate.
+    pacer = FramePacer(PERFORMANCE.get("idle_after_seconds", 0.5), PERFORMANCE.get("idle_frame_rate", 4),
+                       PERFORMANCE.get("background_frame_rate", 20), PERFORMANCE.get("adaptive_pacing", True) and replay is None)
+    replay_inputs = iter(replay) if replay is not None else None
+    # Config edits and quickloads happen outside the tick stream, so a recording can't reproduce them.
+    deterministic = replay is not None or recorder is not None
+    watcher = ConfigWatcher(CONFIG_FILE, DIALOG_SOURCE_DIR) if PERFORMANCE.get("hot_reload", True) and not deterministic else None
+    autosave_seconds = config["game"].get("autosave_seconds", 5)
+    autosaver = None
+    if autosave_seconds > 0 and replay is None:
+        autosaver = Autosaver(config["game"].get("autosave_file", "autosave.bin"), int(autosave_seconds * settings.game.tick_rate))
+    quicksave_file = config["game"].get("quicksave_file", "quicksave.bin")
+    if load_path:
+        try:
+            load_game(load_path, session)
+        except (OSError, ValueError, struct.error) as error:
+            print(f"Could not load {load_path}: {error}")
+    accumulator = 0.0
+    pending_events = []
+    previous_time = time.perf_counter()
     
-    if current_state == EXPLORE:
-        health_text = small_font.render(f"HP: {player.hp}/{player.max_hp}", True, WHITE)
-        health_bar_width = 150
-        health_bar_height = 15
-        health_fill_width = (player.hp / player.max_hp) * health_bar_width
+    while session.running:
+        now = time.perf_counter()
+        accumulator += now - previous_time
+        previous_time = now
+        if profiler is not None:
+            profiler.begin_frame()
+            profiler.phase("events")
         
-        pygame.draw.rect(screen, (0, 0, 0, 150), (10, 10, health_bar_width + 10, 50))
-        pygame.draw.rect(screen, RED, (15, 35, health_bar_width, health_bar_height))
-        pygame.draw.rect(screen, GREEN, (15, 35, health_fill_width, health_bar_height))
-        pygame.draw.rect(screen, BLACK, (15, 35, health_bar_width, health_bar_height), 2)
-        screen.blit(health_text, (15, 15))
+        new_config = watcher.poll() if watcher is not None else None
+        if new_config is not None:
+            try:
+                reload_config(new_config)
+                session.apply_config(config)
+                reload_dialog_corpus()
+                print(f"Reloaded {CONFIG_FILE}")
+            except (KeyError, TypeError, ValueError) as error:
+                print(f"Ignoring changes to {CONFIG_FILE}: {error}")
+        tick_length = settings.game.tick_length if replay is None else 1.0 / replay.tick_rate
         
-        for character in enemies + npcs:
-            if not (isinstance(character, Enemy) and character.is_dead) and abs(player.x - character.x) < INTERACTION_DISTANCE:
-                hint_text = small_font.render(f"Press SPACE to interact with {character.name}", True, WHITE)
-                screen.blit(hint_text, (WIDTH//2 - hint_text.get_width()//2, HEIGHT - 50))
-                break
+        # Logic runs at the tick rate no matter how fast we render; events wait for the next tick.
+        for event in pacer.events():
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3 and profiler is not None:
+                profiler.toggle_overlay()
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F5:
+                save_game(quicksave_file, session)
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F9 and deterministic:
+                print("Quickload is disabled while recording or replaying")
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F9 and os.path.exists(quicksave_file):
+                try:
+                    load_game(quicksave_file, session)
+                except (ValueError, struct.error) as error:
+                    print(f"Could not load {quicksave_file}: {error}")
+            elif replay_inputs is not None:
+                # The replay drives the game; the window only listens for being closed.
+                if event.type == pygame.QUIT:
+                    session.running = False
+            else:
+                pending_events.append(event)
+        keys = pygame.key.get_pressed()
+        if profiler is not None:
+            profiler.phase("update")
+        ticks = 0
+        while accumulator >= tick_length and ticks < settings.game.max_catch_up_ticks and session.running:
+            if replay_inputs is not None:
+                pending_events, keys = next(replay_inputs, (None, None))
+                if pending_events is None:
+                    session.running = False
+                    break
+            session.tick(pending_events, keys)
+            if recorder is not None:
+                recorder.record(pending_events, keys)
+            pending_events = []
+            if autosaver is not None:
+                autosaver.update(session)
+            accumulator -= tick_length
+            ticks += 1
+        if ticks == settings.game.max_catch_up_ticks:
+            # Too far behind: drop the backlog instead of spiraling.
+            accumulator = min(accumulator, tick_length)
+        
+        if profiler is not None:
+            profiler.phase("draw")
+        session.draw(screen, accumulator / tick_length)
+        if profiler is not None:
+            profiler.draw_overlay(screen, pacer.status())
+            profiler.phase("present")
         
-        if kyle_defeated:
-            stick_icon = pygame.transform.scale(stick_of_truth, (50, 50))
-            screen.blit(stick_icon, (WIDTH - 60, 10))
-            stick_text = small_font.render("Stick of Truth", True, (255, 215, 0))
-            screen.blit(stick_text, (WIDTH - 130, 60))
+        if dirty_renderer is not None:
+            dirty_renderer.present()
+        else:
+            pygame.display.flip()
+        if profiler is not None:
+            profiler.end_frame()
+        render_scaler.update(time.perf_counter() - now)
+        if pacer.pace(session):
+            previous_time = time.perf_counter()
     
-    pygame.display.flip()
-    clock.tick(config["game"]["frame_rate"])
+    pace = pacer.summary()
+    print(f"Averaged {pace['fps']:.1f} FPS and {pace['cpu_per_second'] * 100:.0f}% of a CPU core")
+    session.finish()
+    if autosaver is not None:
+        autosaver.close()
+    if recorder is not None:
+        recorder.close(session)
+        print(f"Recorded {recorder.ticks} ticks to {record_path}")
+    if replay is not None:
+        # Read to the end for the trailer even if the last tick quit the game.
+        for _ in replay_inputs:
+            pass
+        report_replay(replay, session)
+
+class HeldKeys:
+    def __init__(self, keys=()):
+        self.keys = set(keys)
+    
+    def __getitem__(self, key):
+        return key in self.keys
+
+def key_code(name):
+    return pygame.key.key_code(name)
+
+class ScriptedInput:
+    # Script steps: {"press": "space"}, {"hold": ["d", "w"], "ticks": 30}, {"wait": 10}
+    def __init__(self, steps):
+        self.ticks = []
+        for step in steps:
+            repeat = step.get("repeat", 1)
+            for _ in range(repeat):
+                if "press" in step:
+                    event = pygame.event.Event(pygame.KEYDOWN, key=key_code(step["press"]))
+                    self.ticks.append(([event], HeldKeys()))
+                elif "hold" in step:
+                    held = HeldKeys(key_code(name) for name in step["hold"])
+                    self.ticks.extend(([], held) for _ in range(step.get("ticks", 1)))
+                elif "wait" in step:
+                    self.ticks.extend(([], HeldKeys()) for _ in range(step["wait"]))
+    
+    def __len__(self):
+        return len(self.ticks)
+    
+    def __iter__(self):
+        return iter(self.ticks)
+
+def load_script(path):
+    with open(path, 'r') as f:
+        return ScriptedInput(json.load(f))
+
+REPLAY_MAGIC = b"SOTR"
+REPLAY_VERSION = 1
+# magic, version, seed, tick rate, config checksum
+REPLAY_HEADER = struct.Struct("<4sBQHI")
+# held keys, event count, ticks; the events belong to the first tick of the run
+REPLAY_RECORD = struct.Struct("<BHH")
+# total ticks, state checksum; follows a record with zero ticks
+REPLAY_TRAILER = struct.Struct("<II")
+REPLAY_QUIT = 0xFFFFFFFF
+# The keys GameSession.update polls; add to this when it starts reading another one.
+REPLAY_HELD_KEYS = (pygame.K_a, pygame.K_d, pygame.K_w, pygame.K_s)
+
+def config_checksum():
+    return zlib.crc32(json.dumps(config, sort_keys=True).encode("utf-8"))
+
+def state_checksum(session):
+    words, tail = session.snapshot()
+    return zlib.crc32(tail, zlib.crc32(words.tobytes()))
+
+class ReplayRecorder:
+    def __init__(self, path, seed):
+        self.seed = seed
+        self.file = open(path, 'wb')
+        self.file.write(REPLAY_HEADER.pack(REPLAY_MAGIC, REPLAY_VERSION, seed, round(settings.game.tick_rate), config_checksum()))
+        self.ticks = 0
+        self.mask = 0
+        self.codes = []
+        self.repeat = 0
+    
+    def record(self, events, keys):
+        mask = 0
+        for bit, key in enumerate(REPLAY_HELD_KEYS):
+            if keys[key]:
+                mask |= 1 << bit
+        codes = [REPLAY_QUIT if event.type == pygame.QUIT else event.key
+                 for event in events if event.type == pygame.KEYDOWN or event.type == pygame.QUIT]
+        self.ticks += 1
+        # Quiet ticks with the same keys held extend the current run.
+        if not codes and mask == self.mask and 0 < self.repeat < 0xFFFF:
+            self.repeat += 1
+            return
+        self.write_run()
+        self.mask, self.codes, self.repeat = mask, codes, 1
+    
+    def write_run(self):
+        if self.repeat:
+            self.file.write(REPLAY_RECORD.pack(self.mask, len(self.codes), self.repeat))
+            self.file.write(array('I', self.codes).tobytes())
+            self.file.flush()
+    
+    def close(self, session):
+        self.write_run()
+        self.repeat = 0
+        self.file.write(REPLAY_RECORD.pack(0, 0, 0))
+        self.file.write(REPLAY_TRAILER.pack(self.ticks, state_checksum(session)))
+        self.file.close()
+
+class Replay:
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            header = f.read(REPLAY_HEADER.size)
+        if len(header) < REPLAY_HEADER.size:
+            raise ValueError(f"{path} is not a replay")
+        magic, version, self.seed, self.tick_rate, self.config_checksum = REPLAY_HEADER.unpack(header)
+        if magic != REPLAY_MAGIC or version != REPLAY_VERSION:
+            raise ValueError(f"{path} is not a version {REPLAY_VERSION} replay")
+        # Filled in once the trailer is read; a recording cut short by a crash has none.
+        self.ticks = None
+        self.checksum = None
+    
+    def records(self):
+        with open(self.path, 'rb') as f:
+            f.seek(REPLAY_HEADER.size)
+            while True:
+                record = f.read(REPLAY_RECORD.size)
+                if len(record) < REPLAY_RECORD.size:
+                    return
+                mask, count, repeat = REPLAY_RECORD.unpack(record)
+                if repeat == 0:
+                    trailer = f.read(REPLAY_TRAILER.size)
+                    if len(trailer) == REPLAY_TRAILER.size:
+                        self.ticks, self.checksum = REPLAY_TRAILER.unpack(trailer)
+                    return
+                data = f.read(count * 4)
+                if len(data) < count * 4:
+                    return
+                codes = array('I')
+                codes.frombytes(data)
+                yield mask, codes, repeat
+    
+    def __len__(self):
+        return sum(repeat for _, _, repeat in self.records())
+    
+    def __iter__(self):
+        held = [HeldKeys(key for bit, key in enumerate(REPLAY_HELD_KEYS) if mask & (1 << bit))
+                for mask in range(1 << len(REPLAY_HELD_KEYS))]
+        for mask, codes, repeat in self.records():
+            keys = held[mask]
+            yield [pygame.event.Event(pygame.QUIT) if code == REPLAY_QUIT else pygame.event.Event(pygame.KEYDOWN, key=code)
+                   for code in codes], keys
+            for _ in range(repeat - 1):
+                yield (), keys
+
+def open_replay(path):
+    replay = Replay(path)
+    if replay.config_checksum != config_checksum():
+        print(f"Warning: {path} was recorded with a different {CONFIG_FILE}, the replay may diverge")
+    return replay
+
+def report_replay(replay, session):
+    if replay.checksum is None:
+        print(f"Replay ended after {session.ticks} ticks (recording has no final state to check)")
+    elif session.ticks < replay.ticks and not session.running:
+        print(f"Replay stopped after {session.ticks} of {replay.ticks} ticks")
+    elif session.ticks == replay.ticks and state_checksum(session) == replay.checksum:
+        print(f"Replay matched the recording after {session.ticks} ticks")
+    else:
+        print(f"Replay DIVERGED from the recording: {session.ticks} ticks played, {replay.ticks} recorded")
+
+def run_replay_headless(replay):
+    load_assets()
+    random.seed(replay.seed)
+    session = GameSession()
+    for events, keys in replay:
+        session.tick(events, keys)
+    session.finish()
+    return session
+
+def run_headless(script, max_ticks=None, stop_states=(GAME_OVER, VICTORY), state=None, seed=None):
+    if seed is not None:
+        random.seed(seed)
+    session = GameSession()
+    if state is not None:
+        session.restore(state)
+        if seed is not None:
+            random.seed(seed)
+    idle = ((), HeldKeys())
+    inputs = iter(script)
+    limit = session.ticks + (len(script) if max_ticks is None else max_ticks)
+    
+    while session.running and session.ticks < limit:
+        events, keys = next(inputs, idle)
+        session.tick(events, keys)
+        if session.current_state in stop_states:
+            break
+    session.finish()
+    return session.summary()
+
+def run_playthroughs(script, runs, seed=None, max_ticks=None, state=None):
+    # Forked runs all start from the same snapshot; the seed makes them diverge.
+    load_assets()
+    return [
+        run_headless(script, max_ticks, state=state, seed=None if seed is None else seed + i)
+        for i in range(runs)
+    ]
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=config["window"]["title"])
+    parser.add_argument("--headless", metavar="SCRIPT", help="run the game without a window, driven by a JSON input script")
+    parser.add_argument("--runs", type=int, default=1, help="number of headless playthroughs")
+    parser.add_argument("--seed", type=int, help="base random seed for headless playthroughs")
+    parser.add_argument("--max-ticks", type=int, help="stop a headless playthrough after this many ticks")
+    parser.add_argument("--profile-out", metavar="PATH", help="write frame timings to a .csv or .json file at exit")
+    parser.add_argument("--load", metavar="SAVE", help="start from a save state (autosave or quicksave file)")
+    parser.add_argument("--record", metavar="REPLAY", help="record the seed and every tick's input to a replay file")
+    parser.add_argument("--replay", metavar="REPLAY", help="play back a recorded replay")
+    parser.add_argument("--uncapped", action="store_true", help="play the replay as fast as possible without a window")
+    args = parser.parse_args(argv)
+    if args.load and (args.record or args.replay):
+        parser.error("--record and --replay start from a new game and can't be combined with --load")
+    if args.uncapped and not args.replay:
+        parser.error("--uncapped needs --replay")
+    
+    replay = open_replay(args.replay) if args.replay else None
+    if args.uncapped:
+        start = time.perf_counter()
+        session = run_replay_headless(replay)
+        elapsed = time.perf_counter() - start
+        print(json.dumps(session.summary(), indent=4))
+        print(f"{session.ticks} ticks in {elapsed:.2f}s "
+              f"({session.ticks / replay.tick_rate / max(elapsed, 1e-9):.0f}x real time)")
+        report_replay(replay, session)
+        return
+    
+    if not args.headless:
+        run(args.load, args.record, replay)
+        if args.profile_out and profiler is not None:
+            profiler.export(args.profile_out)
+        return
+    
+    script = load_script(args.headless)
+    start = time.perf_counter()
+    state = read_snapshots(args.load) if args.load else None
+    results = run_playthroughs(script, args.runs, args.seed, args.max_ticks, state)
+    elapsed = time.perf_counter() - start
+    
+    outcomes = {}
+    for result in results:
+        outcomes[result["state"]] = outcomes.get(result["state"], 0) + 1
+    total_ticks = sum(result["ticks"] for result in results)
+    print(json.dumps(results[-1] if args.runs == 1 else {"outcomes": outcomes}, indent=4))
+    print(f"{args.runs} playthrough(s), {total_ticks} ticks in {elapsed:.2f}s "
+          f"({args.runs / elapsed * 60:.0f} playthroughs/min)")
 
-pygame.quit()
-sys.exit()
+if __name__ == "__main__":
+    main(sys.argv[1:])
+    if telemetry is not None:
+        telemetry.close()
+        stats = telemetry.stats()
+        print(f"Telemetry: {stats['written']} records written, {stats['dropped']} dropped")
+    asset_loader.shutdown()
+    pygame.quit()
+    sys.exit()
@@ -0,0 +1,144 @@
+import argparse
+import asyncio
+import json
+import random
+import time
+
+# The client never imports Game (or the server, which does), so it starts without pygame.
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+class ClientConnection:
+    # Drives a share of the sessions over one socket: answers every turn with a random action
+    # and tries to block each enemy attack.
+    def __init__(self, reader, writer, policy, block_rate, rng):
+        self.reader = reader
+        self.writer = writer
+        self.policy = policy
+        self.block_rate = block_rate
+        self.rng = rng
+        self.results = {}
+        self.errors = []
+        self.latencies = []
+        self.sent_at = {}
+        self.open_sessions = 0
+
+    def send(self, request):
+        if request.get("session") is not None:
+            self.sent_at[request["session"]] = time.perf_counter()
+        self.writer.write((json.dumps(request) + "\n").encode("utf-8"))
+
+    def on_message(self, message):
+        event = message.get("event")
+        session = message.get("session")
+        if session in self.sent_at:
+            self.latencies.append(time.perf_counter() - self.sent_at.pop(session))
+
+        if event == "started":
+            self.open_sessions += 1
+        elif event == "state":
+            if message["player_turn"]:
+                actions, weights = zip(*self.policy.items())
+                self.send({"op": "action", "session": session, "action": self.rng.choices(actions, weights)[0]})
+            elif message["block_window"] and not message["blocking"] and self.rng.random() < self.block_rate:
+                self.send({"op": "block", "session": session})
+        elif event in ("result", "evicted"):
+            result = message.get("result", "evicted")
+            self.results[result] = self.results.get(result, 0) + 1
+            self.open_sessions -= 1
+        elif event == "error":
+            self.errors.append(message["error"])
+
+    async def run(self, enemies, sessions, idle_sessions):
+        # The server answers one connection's requests in order, so the last idle_sessions "started"
+        # replies belong to sessions that are started and then abandoned, to exercise idle eviction.
+        for i in range(sessions + idle_sessions):
+            self.send({"op": "start", "enemy": enemies[i % len(enemies)]})
+        await self.writer.drain()
+
+        started = 0
+        idle = set()
+        while sum(self.results.values()) < sessions + idle_sessions:
+            line = await self.reader.readline()
+            if not line:
+                break
+            message = json.loads(line)
+            if message.get("event") == "started":
+                started += 1
+                if started > sessions:
+                    idle.add(message["session"])
+            elif message.get("event") == "error" and message.get("session") is None:
+                # A start that was refused never gets a result.
+                sessions -= 1
+            if message.get("session") in idle and message.get("event") == "state":
+                continue
+            self.on_message(message)
+            await self.writer.drain()
+
+async def request_stats(host, port):
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(b'{"op": "stats"}\n')
+    await writer.drain()
+    stats = json.loads(await reader.readline())
+    writer.close()
+    return stats
+
+async def run_clients(host, port, enemies, sessions, idle_sessions, connections, policy, block_rate, seed):
+    rng = random.Random(seed)
+    clients = []
+    for i in range(connections):
+        reader, writer = await asyncio.open_connection(host, port, limit=1 << 20)
+        clients.append(ClientConnection(reader, writer, policy, block_rate, random.Random(rng.random())))
+    start = time.perf_counter()
+    share = [sessions // connections + (i < sessions % connections) for i in range(connections)]
+    idle_share = [idle_sessions // connections + (i < idle_sessions % connections) for i in range(connections)]
+    await asyncio.gather(*(client.run(enemies, count, idle) for client, count, idle in zip(clients, share, idle_share)))
+    elapsed = time.perf_counter() - start
+    for client in clients:
+        client.writer.close()
+    return clients, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Local load-test client for battle_server.py")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--enemy", action="append", help="enemy to fight (default: Princess Kenny)")
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--idle-sessions", type=int, default=0, help="extra sessions that never act, to test eviction")
+    parser.add_argument("--connections", type=int, default=10)
+    parser.add_argument("--policy", default="Attack=1,Special=1", help="action weights, e.g. Attack=3,Special=1,Item=1")
+    parser.add_argument("--block-rate", type=float, default=0.5)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    policy = {}
+    for part in args.policy.split(","):
+        name, _, weight = part.partition("=")
+        policy[name.strip()] = float(weight) if weight else 1.0
+    enemies = args.enemy or ["Princess Kenny"]
+
+    clients, elapsed = asyncio.run(run_clients(args.host, args.port, enemies, args.sessions, args.idle_sessions,
+                                               args.connections, policy, args.block_rate, args.seed))
+    results, errors, latencies = {}, [], []
+    for client in clients:
+        for result, count in client.results.items():
+            results[result] = results.get(result, 0) + count
+        errors += client.errors
+        latencies += client.latencies
+    latencies.sort()
+    summary = {
+        "results": results,
+        "errors": len(errors),
+        "seconds": round(elapsed, 2),
+        "latency_ms": {
+            "p50": latencies[len(latencies) // 2] * 1000 if latencies else None,
+            "p99": latencies[int(len(latencies) * 0.99)] * 1000 if latencies else None,
+        },
+        "server": asyncio.run(request_stats(args.host, args.port)),
+    }
+    if errors:
+        summary["first_error"] = errors[0]
+    print(json.dumps(summary, indent=4))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import asyncio
+import itertools
+import json
+import time
+
+import Game
+from battle_client import DEFAULT_HOST, DEFAULT_PORT
+
+# A client that stops reading gets dropped instead of buffering without bound.
+MAX_WRITE_BUFFER = 1024 * 1024
+
+class BattleSession:
+    def __init__(self, session_id, connection, enemy_config, now):
+        self.id = session_id
+        self.connection = connection
+        self.player = Game.create_player()
+        self.enemy = Game.Enemy(enemy_config)
+        self.battle = Game.BattleSystem(self.player, Game.settings.battle)
+        self.battle.start_battle(self.enemy)
+        self.last_seen = now
+
+    def state(self):
+        battle = self.battle
+        return {
+            "event": "state",
+            "session": self.id,
+            "player_hp": self.player.hp,
+            "enemy_hp": self.enemy.hp,
+            "player_turn": battle.player_turn and not battle.enemy_attack_pending,
+            "block_window": battle.enemy_attack_pending and battle.block_window_timer > 0,
+            "blocking": battle.block_active,
+            "message": battle.message,
+        }
+
+class BattleServer:
+    # Newline-delimited JSON over TCP. Requests:
+    #   {"op": "start", "enemy": name}           -> "started" with the new session id, then "state"
+    #   {"op": "action", "session": id, "action": name}
+    #   {"op": "block", "session": id}           -> "block" with whether it landed in the window
+    #   {"op": "leave", "session": id}
+    #   {"op": "stats"}
+    # The server owns all battle state; clients only ever send inputs, and every input is checked
+    # against the session's turn and timers. Replies are queued and written once per tick.
+    def __init__(self, idle_seconds=60.0, max_sessions=10000):
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self.enemies = {enemy["name"]: enemy for enemy in Game.config["characters"]["enemies"]}
+        self.sessions = {}
+        # Only sessions waiting on the enemy's attack have timers running, so only they are ticked.
+        self.pending = set()
+        self.ids = itertools.count(1)
+        self.outbox = {}
+        self.ticks = 0
+        self.tick_time = 0.0
+        self.evicted = 0
+        self.finished = 0
+        self.last_sweep = time.monotonic()
+
+    def send(self, connection, message):
+        self.outbox.setdefault(connection, []).append(json.dumps(message))
+
+    def flush(self):
+        for connection, lines in self.outbox.items():
+            if connection.is_closing():
+                continue
+            connection.write(("\n".join(lines) + "\n").encode("utf-8"))
+            if connection.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+                connection.close()
+        self.outbox.clear()
+
+    def error(self, connection, request, text):
+        self.send(connection, {"event": "error", "session": request.get("session"), "error": text})
+
+    def handle(self, connection, request, now):
+        op = request.get("op")
+        if op == "start":
+            enemy_config = self.enemies.get(request.get("enemy"))
+            if enemy_config is None:
+                return self.error(connection, request, f"unknown enemy, expected one of {', '.join(self.enemies)}")
+            if len(self.sessions) >= self.max_sessions:
+                return self.error(connection, request, "server full")
+            session = BattleSession(next(self.ids), connection, enemy_config, now)
+            self.sessions[session.id] = session
+            self.send(connection, {"event": "started", "session": session.id, "enemy": session.enemy.name,
+                                   "actions": session.battle.actions})
+            self.send(connection, session.state())
+            return
+        if op == "stats":
+            self.send(connection, self.stats())
+            return
+
+        session = self.sessions.get(request.get("session"))
+        if session is None or session.connection is not connection:
+            return self.error(connection, request, "unknown session")
+        session.last_seen = now
+        battle = session.battle
+
+        if op == "action":
+            action = request.get("action")
+            if not battle.player_turn or battle.enemy_attack_pending:
+                return self.error(connection, request, "not your turn")
+            if action not in battle.actions:
+                return self.error(connection, request, f"unknown action, expected one of {', '.join(battle.actions)}")
+            battle.selected_action = battle.actions.index(action)
+            result = battle.execute_action()
+            if result is not None:
+                self.finish(session, result)
+            else:
+                self.pending.add(session)
+                self.send(connection, session.state())
+        elif op == "block":
+            self.send(connection, {"event": "block", "session": session.id, "accepted": battle.activate_block()})
+        elif op == "leave":
+            self.finish(session, "left")
+        else:
+            self.error(connection, request, f"unknown op {op!r}")
+
+    def finish(self, session, result):
+        self.send(session.connection, {"event": "result", "session": session.id, "result": result,
+                                       "player_hp": session.player.hp, "enemy_hp": session.enemy.hp,
+                                       "message": session.battle.message})
+        self.remove(session)
+        self.finished += 1
+
+    def remove(self, session):
+        self.sessions.pop(session.id, None)
+        self.pending.discard(session)
+
+    def tick(self, now):
+        start = time.perf_counter()
+        for session in list(self.pending):
+            battle = session.battle
+            result = battle.update()
+            if result is not None:
+                self.finish(session, result)
+            elif not battle.enemy_attack_pending:
+                self.pending.discard(session)
+                self.send(session.connection, session.state())
+
+        if now - self.last_sweep >= 1.0:
+            self.last_sweep = now
+            for session in [s for s in self.sessions.values() if now - s.last_seen > self.idle_seconds]:
+                # A battle in the middle of the enemy's turn keeps running even if the client is quiet.
+                if session not in self.pending:
+                    self.send(session.connection, {"event": "evicted", "session": session.id})
+                    self.remove(session)
+                    self.evicted += 1
+        self.ticks += 1
+        self.tick_time += time.perf_counter() - start
+
+    def stats(self):
+        return {
+            "event": "stats",
+            "sessions": len(self.sessions),
+            "pending": len(self.pending),
+            "finished": self.finished,
+            "evicted": self.evicted,
+            "ticks": self.ticks,
+            "tick_mean_ms": self.tick_time / max(1, self.ticks) * 1000,
+        }
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    self.error(writer, {}, "invalid JSON")
+                    continue
+                if not isinstance(request, dict):
+                    self.error(writer, {}, "requests must be JSON objects")
+                    continue
+                self.handle(writer, request, time.monotonic())
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            for session in [s for s in self.sessions.values() if s.connection is writer]:
+                self.remove(session)
+            self.outbox.pop(writer, None)
+            writer.close()
+
+    async def run_ticks(self, tick_rate):
+        loop = asyncio.get_running_loop()
+        tick_length = 1.0 / tick_rate
+        next_tick = loop.time()
+        while True:
+            self.tick(time.monotonic())
+            self.flush()
+            next_tick += tick_length
+            delay = next_tick - loop.time()
+            if delay < -tick_length * Game.settings.game.max_catch_up_ticks:
+                # Overloaded: catching up would tick back to back and starve the connection readers,
+                # so every battle slows down instead and the schedule restarts from now.
+                next_tick = loop.time()
+                delay = 0
+            await asyncio.sleep(max(0.0, delay))
+
+async def serve(host, port, idle_seconds, max_sessions):
+    server = BattleServer(idle_seconds, max_sessions)
+    listener = await asyncio.start_server(server.handle_client, host, port)
+    print(f"Battle server listening on {host}:{port} at {Game.settings.game.tick_rate} ticks/s")
+    async with listener:
+        await asyncio.gather(listener.serve_forever(), server.run_ticks(Game.settings.game.tick_rate))
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless server hosting many concurrent battles")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--idle-seconds", type=float, default=60.0, help="evict sessions with no input for this long")
+    parser.add_argument("--max-sessions", type=int, default=10000)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.idle_seconds, args.max_sessions))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if Game.telemetry is not None:
+            Game.telemetry.close()
+
+if __name__ == "__main__":
+    main()
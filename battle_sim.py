@@ -0,0 +1,156 @@
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+# Results go to stdout as JSON, so keep pygame's greeting out of it.
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+import Game
+
+ATTACK, SPECIAL, ITEM, RUN = 0, 1, 2, 3
+POLICY_ACTIONS = {"attack": ATTACK, "special": SPECIAL, "item": ITEM, "run": RUN}
+
+ONGOING, WIN, LOSE, FLED, TIMEOUT = 0, 1, 2, 3, 4
+OUTCOME_NAMES = {WIN: "win", LOSE: "lose", FLED: "fled", TIMEOUT: "timeout"}
+
+def parse_policy(text):
+    weights = np.zeros(len(POLICY_ACTIONS))
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip().lower()
+        if name not in POLICY_ACTIONS:
+            raise ValueError(f"Unknown action '{name}' in policy, expected one of {', '.join(POLICY_ACTIONS)}")
+        weights[POLICY_ACTIONS[name]] = float(weight) if weight else 1.0
+    if weights.sum() <= 0:
+        raise ValueError("Policy needs at least one action with a positive weight")
+    return weights / weights.sum()
+
+def simulate_battles(battle_config, player_hp, player_max_hp, enemy_hp, policy, block_rate,
+                     battles, max_turns=200, rng=None):
+    rng = rng if rng is not None else np.random.default_rng()
+    attack = battle_config["player_move_damage"]["Attack"]
+    special = battle_config["player_move_damage"]["Special"]
+    enemy_damage = battle_config["enemy_move_damage"]
+    heal = battle_config["heal_amount"]
+    block_reduction = battle_config.get("block_reduction", 0.5)
+    cumulative_policy = np.cumsum(policy)
+
+    player = np.full(battles, player_hp, dtype=np.int32)
+    enemy = np.full(battles, enemy_hp, dtype=np.int32)
+    outcome = np.full(battles, ONGOING, dtype=np.int8)
+    turns = np.zeros(battles, dtype=np.int32)
+
+    for turn in range(1, max_turns + 1):
+        lanes = np.flatnonzero(outcome == ONGOING)
+        if lanes.size == 0:
+            break
+        turns[lanes] = turn
+
+        # Player move: every lane rolls its action and both damage ranges, then picks.
+        action = np.searchsorted(cumulative_policy, rng.random(lanes.size), side="right")
+        attack_roll = rng.integers(attack["min"], attack["max"] + 1, lanes.size)
+        special_roll = rng.integers(special["min"], special["max"] + 1, lanes.size)
+        damage = np.where(action == ATTACK, attack_roll, np.where(action == SPECIAL, special_roll, 0))
+        enemy[lanes] = np.maximum(0, enemy[lanes] - damage)
+
+        healing = lanes[action == ITEM]
+        player[healing] = np.minimum(player[healing] + heal, player_max_hp)
+        outcome[lanes[action == RUN]] = FLED
+
+        won = lanes[(enemy[lanes] <= 0) & (action != RUN)]
+        outcome[won] = WIN
+
+        # Enemy move for the lanes still fighting.
+        lanes = lanes[outcome[lanes] == ONGOING]
+        base_damage = rng.integers(enemy_damage["min"], enemy_damage["max"] + 1, lanes.size)
+        blocked = rng.random(lanes.size) < block_rate
+        damage = np.where(blocked, (base_damage * block_reduction).astype(np.int32), base_damage)
+        player[lanes] = np.maximum(0, player[lanes] - damage)
+        outcome[lanes[player[lanes] <= 0]] = LOSE
+
+    outcome[outcome == ONGOING] = TIMEOUT
+    return outcome, turns, player
+
+def simulate(battle_config, player_hp, player_max_hp, enemy_hp, policy, block_rate,
+             battles, max_turns=200, batch_size=1_000_000, seed=None):
+    rng = np.random.default_rng(seed)
+    outcomes, turns, hp = [], [], []
+    for start in range(0, battles, batch_size):
+        count = min(batch_size, battles - start)
+        batch = simulate_battles(battle_config, player_hp, player_max_hp, enemy_hp, policy,
+                                 block_rate, count, max_turns, rng)
+        outcomes.append(batch[0])
+        turns.append(batch[1])
+        hp.append(batch[2])
+    return np.concatenate(outcomes), np.concatenate(turns), np.concatenate(hp)
+
+def histogram(values, bins):
+    counts = np.bincount(values, minlength=bins)
+    return {int(value): int(count) for value, count in enumerate(counts) if count}
+
+def summarize(outcome, turns, player_hp, player_max_hp):
+    battles = outcome.size
+    wins = outcome == WIN
+    summary = {
+        "battles": battles,
+        "outcomes": {name: float(np.mean(outcome == code)) for code, name in OUTCOME_NAMES.items()},
+        "win_rate": float(np.mean(wins)),
+    }
+    if wins.any():
+        win_turns = turns[wins]
+        summary["turns_to_kill"] = {
+            "mean": float(win_turns.mean()),
+            "p50": float(np.percentile(win_turns, 50)),
+            "p95": float(np.percentile(win_turns, 95)),
+            "histogram": histogram(win_turns, int(win_turns.max()) + 1),
+        }
+        bucket = 10
+        summary["hp_remaining"] = {
+            "mean": float(player_hp[wins].mean()),
+            "bucket": bucket,
+            "histogram": histogram(player_hp[wins] // bucket * bucket, player_max_hp + 1),
+        }
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description="Monte Carlo battle simulator for game_config.json")
+    parser.add_argument("--config", default=Game.CONFIG_FILE)
+    parser.add_argument("--enemy", action="append", help="enemy name to simulate (default: all enemies)")
+    parser.add_argument("--enemy-hp", type=int, help="override enemy HP")
+    parser.add_argument("--player-hp", type=int, help="starting player HP (default: full)")
+    parser.add_argument("--policy", default="attack=1", help="action mix, e.g. attack=0.6,special=0.3,item=0.1")
+    parser.add_argument("--block-rate", type=float, default=0.5, help="probability the player lands the block")
+    parser.add_argument("--battles", type=int, default=1_000_000)
+    parser.add_argument("--max-turns", type=int, default=200)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    config = Game.read_config(args.config)
+    battle_config = config["battle"]
+    player_max_hp = config["characters"]["player"]["hp"]
+    player_hp = args.player_hp if args.player_hp is not None else player_max_hp
+    policy = parse_policy(args.policy)
+
+    enemies = config["characters"]["enemies"]
+    if args.enemy:
+        enemies = [enemy for enemy in enemies if enemy["name"] in args.enemy]
+
+    results = {}
+    for enemy in enemies:
+        enemy_hp = args.enemy_hp if args.enemy_hp is not None else enemy["hp"]
+        start = time.perf_counter()
+        outcome, turns, hp = simulate(battle_config, player_hp, player_max_hp, enemy_hp, policy,
+                                      args.block_rate, args.battles, args.max_turns, seed=args.seed)
+        results[enemy["name"]] = summarize(outcome, turns, hp, player_max_hp)
+        results[enemy["name"]]["seconds"] = round(time.perf_counter() - start, 3)
+
+    print(json.dumps(results, indent=4))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+CACHE_DIR = "battle_solver_cache"
+SOLVER_VERSION = 1
+DEFAULT_BLOCK_RATE = 0.5
+DAMAGE_ACTIONS = ("Attack", "Special")
+SOLVABLE_ACTIONS = DAMAGE_ACTIONS + ("Item", "Run")
+TOLERANCE = 1e-13
+# Actions this close to the best win probability count as equally good; the shorter battle wins the tie.
+TIE = 1e-9
+MAX_SWEEPS = 100_000
+
+def damage_distribution(damage):
+    values = np.arange(damage["min"], damage["max"] + 1)
+    return values, np.full(values.size, 1.0 / values.size)
+
+def enemy_transitions(battle_config, player_max_hp, block_rate):
+    # transitions[p, q]: chance the enemy's attack takes the player from p to q HP.
+    # Column 0 stays empty because a dead player can't win any more.
+    size = player_max_hp + 1
+    transitions = np.zeros((size, size))
+    hp = np.arange(1, size)
+    reduction = battle_config.get("block_reduction", 0.5)
+    for damage, chance in zip(*damage_distribution(battle_config["enemy_move_damage"])):
+        for taken, weight in ((int(damage * reduction), block_rate), (damage, 1 - block_rate)):
+            np.add.at(transitions, (hp, np.maximum(0, hp - taken)), chance * weight)
+    transitions[:, 0] = 0
+    return transitions
+
+class Solution:
+    def __init__(self, actions, action_values, policy, turns):
+        self.actions = list(actions)
+        # action_values[action, enemy_hp, player_hp]: win probability of taking that action, then playing optimally.
+        self.action_values = action_values
+        self.values = action_values.max(axis=0)
+        self.policy = policy
+        # Expected number of player turns left under the policy.
+        self.turns = turns
+
+    @property
+    def player_max_hp(self):
+        return self.action_values.shape[2] - 1
+
+    @property
+    def max_enemy_hp(self):
+        return self.action_values.shape[1] - 1
+
+    def best_action(self, player_hp, enemy_hp):
+        return self.actions[self.policy[enemy_hp, player_hp]]
+
+    def win_probability(self, player_hp, enemy_hp):
+        return float(self.values[enemy_hp, player_hp])
+
+    def expected_turns(self, player_hp, enemy_hp):
+        return float(self.turns[enemy_hp, player_hp])
+
+    def action_probabilities(self, player_hp, enemy_hp):
+        return {action: float(self.action_values[i, enemy_hp, player_hp]) for i, action in enumerate(self.actions)}
+
+def solve(battle_config, player_max_hp, max_enemy_hp, block_rate=DEFAULT_BLOCK_RATE, run_value=0.0):
+    actions = list(battle_config["actions"])
+    unknown = [action for action in actions if action not in SOLVABLE_ACTIONS]
+    if unknown:
+        raise ValueError(f"Can't solve battles with unknown actions: {', '.join(unknown)}")
+
+    transitions = enemy_transitions(battle_config, player_max_hp, block_rate)
+    heal_target = np.minimum(np.arange(player_max_hp + 1) + battle_config["heal_amount"], player_max_hp)
+    damage = {action: damage_distribution(battle_config["player_move_damage"][action])
+              for action in actions if action in DAMAGE_ACTIONS}
+
+    shape = (max_enemy_hp + 1, player_max_hp + 1)
+    action_values = np.zeros((len(actions),) + shape)
+    policy = np.zeros(shape, dtype=np.int8)
+    turns = np.zeros(shape)
+    # after_enemy[e, p]: win probability when the enemy with e HP is about to attack a player with p HP.
+    # A dead enemy doesn't get its attack, so row 0 is a win. after_enemy_turns holds the turns still to come.
+    after_enemy = np.zeros(shape)
+    after_enemy[0, 1:] = 1.0
+    after_enemy_turns = np.zeros(shape)
+
+    # Enemy HP never goes up, so lower levels are final before a level is solved. Within a level,
+    # Item (and zero damage rolls) can loop back, so each level is solved by value iteration.
+    for enemy_hp in range(1, max_enemy_hp + 1):
+        known, known_turns, stay = {}, {}, {}
+        for action, (values, chances) in damage.items():
+            targets = np.maximum(0, enemy_hp - values)
+            lower = targets < enemy_hp
+            known[action] = chances[lower] @ after_enemy[targets[lower]]
+            known_turns[action] = chances[lower] @ after_enemy_turns[targets[lower]]
+            stay[action] = chances[~lower].sum()
+
+        value = np.zeros(player_max_hp + 1)
+        value_turns = np.zeros(player_max_hp + 1)
+        level = action_values[:, enemy_hp]
+        level_turns = np.zeros_like(level)
+        for _ in range(MAX_SWEEPS):
+            attacked = transitions @ value
+            attacked_turns = transitions @ value_turns
+            for i, action in enumerate(actions):
+                if action in DAMAGE_ACTIONS:
+                    level[i] = known[action] + stay[action] * attacked
+                    level_turns[i] = 1 + known_turns[action] + stay[action] * attacked_turns
+                elif action == "Item":
+                    level[i] = attacked[heal_target]
+                    level_turns[i] = 1 + attacked_turns[heal_target]
+                else:
+                    level[i] = run_value
+                    level_turns[i] = 1
+            level[:, 0] = 0
+            new_value = level.max(axis=0)
+            candidates = np.where(level >= new_value - TIE, level_turns, np.inf)
+            choice = candidates.argmin(axis=0)
+            new_turns = candidates.min(axis=0)
+            new_turns[0] = 0
+            converged = max(np.abs(new_value - value).max(), np.abs(new_turns - value_turns).max()) < TOLERANCE
+            value, value_turns = new_value, new_turns
+            if converged:
+                break
+        policy[enemy_hp] = choice
+        turns[enemy_hp] = value_turns
+        after_enemy[enemy_hp] = transitions @ value
+        after_enemy_turns[enemy_hp] = transitions @ value_turns
+
+    np.clip(action_values, 0.0, 1.0, out=action_values)
+    return Solution(actions, action_values, policy, turns)
+
+def cache_key(battle_config, player_max_hp, max_enemy_hp, block_rate, run_value):
+    relevant = {
+        "version": SOLVER_VERSION,
+        "actions": battle_config["actions"],
+        "player_move_damage": {action: battle_config["player_move_damage"][action]
+                               for action in battle_config["actions"] if action in DAMAGE_ACTIONS},
+        "enemy_move_damage": battle_config["enemy_move_damage"],
+        "heal_amount": battle_config["heal_amount"],
+        "block_reduction": battle_config.get("block_reduction", 0.5),
+        "player_max_hp": player_max_hp,
+        "max_enemy_hp": max_enemy_hp,
+        "block_rate": block_rate,
+        "run_value": run_value,
+    }
+    return hashlib.sha1(json.dumps(relevant, sort_keys=True).encode("utf-8")).hexdigest()[:20]
+
+solutions = {}
+
+def load_or_solve(battle_config, player_max_hp, max_enemy_hp, block_rate=DEFAULT_BLOCK_RATE, run_value=0.0,
+                  cache_dir=CACHE_DIR):
+    key = cache_key(battle_config, player_max_hp, max_enemy_hp, block_rate, run_value)
+    solution = solutions.get(key)
+    if solution is not None:
+        return solution
+
+    path = os.path.join(cache_dir, key + ".npz") if cache_dir else None
+    if path and os.path.exists(path):
+        with np.load(path) as data:
+            solution = Solution(data["actions"].tolist(), data["action_values"], data["policy"], data["turns"])
+    else:
+        solution = solve(battle_config, player_max_hp, max_enemy_hp, block_rate, run_value)
+        if path:
+            os.makedirs(cache_dir, exist_ok=True)
+            with open(path + ".tmp", 'wb') as f:
+                np.savez(f, actions=np.array(solution.actions), action_values=solution.action_values,
+                         policy=solution.policy, turns=solution.turns)
+            os.replace(path + ".tmp", path)
+    solutions[key] = solution
+    return solution
+
+def policy_table(solution, enemy_hp, step):
+    return {player_hp: solution.best_action(player_hp, enemy_hp)
+            for player_hp in range(step, solution.player_max_hp + 1, step)}
+
+def main():
+    # Game imports this module for the in-battle hint, so it's only imported once we run on our own.
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    # Results go to stdout as JSON, so keep pygame's greeting out of it.
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+    import Game
+
+    parser = argparse.ArgumentParser(description="Exact optimal-play battle solver for game_config.json")
+    parser.add_argument("--config", default=Game.CONFIG_FILE)
+    parser.add_argument("--enemy", action="append", help="enemy name to solve (default: all enemies)")
+    parser.add_argument("--player-hp", type=int, help="starting player HP (default: full)")
+    parser.add_argument("--block-rate", type=float, default=DEFAULT_BLOCK_RATE, help="probability the player lands the block")
+    parser.add_argument("--run-value", type=float, default=0.0, help="how much running away is worth compared to a win")
+    parser.add_argument("--policy-step", type=int, default=0, help="also print the best action every N player HP")
+    parser.add_argument("--no-cache", action="store_true", help="always solve from scratch")
+    args = parser.parse_args()
+
+    config = Game.read_config(args.config)
+    battle_config = config["battle"]
+    player_max_hp = config["characters"]["player"]["hp"]
+    player_hp = args.player_hp if args.player_hp is not None else player_max_hp
+
+    enemies = config["characters"]["enemies"]
+    if args.enemy:
+        enemies = [enemy for enemy in enemies if enemy["name"] in args.enemy]
+
+    results = {}
+    for enemy in enemies:
+        start = time.perf_counter()
+        solution = load_or_solve(battle_config, player_max_hp, enemy["hp"], args.block_rate, args.run_value,
+                                 None if args.no_cache else CACHE_DIR)
+        result = {
+            "win_probability": solution.win_probability(player_hp, enemy["hp"]),
+            "best_action": solution.best_action(player_hp, enemy["hp"]),
+            "expected_turns": solution.expected_turns(player_hp, enemy["hp"]),
+            "actions": solution.action_probabilities(player_hp, enemy["hp"]),
+        }
+        if args.policy_step > 0:
+            result["policy_at_full_enemy_hp"] = policy_table(solution, enemy["hp"], args.policy_step)
+        result["seconds"] = round(time.perf_counter() - start, 4)
+        results[enemy["name"]] = result
+
+    print(json.dumps(results, indent=4))
+
+if __name__ == "__main__":
+    main()
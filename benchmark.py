@@ -0,0 +1,211 @@
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+import Game
+
+BASELINE_FILE = "benchmark_baseline.json"
+NPC_COUNTS = (3, 100, 1000, 10000)
+
+def spread_npcs(count):
+    templates = Game.config["characters"]["npcs"]
+    npcs = []
+    for i in range(count):
+        npc = Game.NPC(templates[i % len(templates)])
+        npc.x = 50 + (i * 37) % max(1, Game.WIDTH - npc.width - 100)
+        npc.y = 250 + (i * 53) % max(1, Game.HEIGHT - npc.height - 300)
+        npc.save_position()
+        npcs.append(npc)
+    return npcs
+
+def explore_scene(count):
+    session = Game.GameSession()
+    session.set_npcs(spread_npcs(count))
+    return session, lambda: None
+
+def dialog_scene():
+    session = Game.GameSession()
+    npc = session.npcs[0]
+    session.current_state = Game.DIALOG
+    session.current_interactive = npc
+    session.dialog_system.start_dialog(Game.resolve_dialogs(npc.dialogs))
+    return session, lambda: None
+
+def battle_scene():
+    session = Game.GameSession()
+    battle = session.battle_system
+    enemy = session.enemies[0]
+    session.current_state = Game.BATTLE
+    battle.start_battle(enemy)
+
+    def keep_fighting():
+        # Nobody dies and the block prompt keeps flashing.
+        for character in (session.player, enemy):
+            character.hp = character.max_hp
+            character.is_dead = False
+        if session.current_state != Game.BATTLE or not battle.active:
+            session.current_state = Game.BATTLE
+            battle.start_battle(enemy)
+        if battle.player_turn and not battle.enemy_attack_pending:
+            battle.selected_action = 0
+            battle.execute_action()
+    return session, keep_fighting
+
+def victory_scene():
+    session = Game.GameSession()
+    session.current_state = Game.VICTORY
+    session.kyle_defeated = True
+
+    def hold_victory():
+        session.current_state = Game.VICTORY
+        session.victory_timer = 180
+    return session, hold_victory
+
+def replay_scene(path):
+    replay = Game.open_replay(path)
+    random.seed(replay.seed)
+    session = Game.GameSession()
+    inputs = iter(replay)
+    # Once the recording runs out the game just idles.
+    return session, lambda: next(inputs, None)
+
+def replay_name(path):
+    return "replay_" + os.path.splitext(os.path.basename(path))[0]
+
+def scenarios(replays=()):
+    result = {f"explore_{count}_npcs": (lambda count=count: explore_scene(count)) for count in NPC_COUNTS}
+    result["dialog"] = dialog_scene
+    result["battle_block_prompt"] = battle_scene
+    result["victory"] = victory_scene
+    for path in replays:
+        result[replay_name(path)] = lambda path=path: replay_scene(path)
+    return result
+
+def frames_for(name, frames, replays=()):
+    # Recorded sessions are measured in full.
+    for path in replays:
+        if name == replay_name(path):
+            return len(Game.Replay(path))
+    # The largest crowds are expensive to draw; keep the run time bounded.
+    for count in NPC_COUNTS:
+        if name == f"explore_{count}_npcs" and count > 100:
+            return max(10, frames * 100 // count)
+    return frames
+
+def run_frame(session, prepare, keys):
+    events, keys = prepare() or ((), keys)
+    start = time.perf_counter()
+    session.tick(events, keys)
+    middle = time.perf_counter()
+    session.draw(Game.screen)
+    end = time.perf_counter()
+    return middle - start, end - middle
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+def measure(name, build, frames, warmup, seed):
+    random.seed(seed)
+    session, prepare = build()
+    keys = Game.HeldKeys()
+    for _ in range(warmup):
+        run_frame(session, prepare, keys)
+
+    update_times, draw_times = [], []
+    for _ in range(frames):
+        update_time, draw_time = run_frame(session, prepare, keys)
+        update_times.append(update_time)
+        draw_times.append(draw_time)
+
+    # Allocation pass is separate: tracing slows everything down.
+    alloc_frames = min(frames, 30)
+    peaks = []
+    tracemalloc.start()
+    for _ in range(alloc_frames):
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        run_frame(session, prepare, keys)
+        peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    tracemalloc.stop()
+
+    totals = [u + d for u, d in zip(update_times, draw_times)]
+    return {
+        "frames": frames,
+        "update_mean_ms": sum(update_times) / frames * 1000,
+        "update_p95_ms": percentile(update_times, 95) * 1000,
+        "draw_mean_ms": sum(draw_times) / frames * 1000,
+        "draw_p95_ms": percentile(draw_times, 95) * 1000,
+        "frame_mean_ms": sum(totals) / frames * 1000,
+        "frame_p95_ms": percentile(totals, 95) * 1000,
+        "alloc_kb_per_frame": sum(peaks) / len(peaks) / 1024,
+    }
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        for metric in ("frame_mean_ms", "frame_p95_ms"):
+            if result[metric] > previous[metric] * (1 + threshold):
+                regressions.append(f"{name}: {metric} {previous[metric]:.3f} -> {result[metric]:.3f} ms")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Frame-time benchmarks for the game's scenes")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--only", action="append", help="run only these scenarios")
+    parser.add_argument("--replay", action="append", default=[], help="also benchmark a recorded replay (Game.py --record)")
+    parser.add_argument("--render-scale", type=float, default=1.0, help="draw the scene at this fraction of the window size")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--update-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown before failing, 0.2 = 20%%")
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    args = parser.parse_args()
+
+    Game.render_scaler = Game.RenderScaler(args.render_scale)
+    # Scaled runs are kept apart from full-resolution ones in the baseline.
+    suffix = "" if Game.render_scaler.scale == 1.0 else f"@{Game.render_scaler.scale:g}"
+    results = {}
+    for name, build in scenarios(args.replay).items():
+        if args.only and name not in args.only:
+            continue
+        frames = frames_for(name, args.frames, args.replay)
+        warmup = 0 if name.startswith("replay_") else min(args.warmup, frames)
+        result = measure(name, build, frames, warmup, args.seed)
+        name += suffix
+        results[name] = result
+        print(f"{name:24} update {result['update_mean_ms']:8.3f} ms (p95 {result['update_p95_ms']:8.3f})  "
+              f"draw {result['draw_mean_ms']:8.3f} ms (p95 {result['draw_p95_ms']:8.3f})  "
+              f"alloc {result['alloc_kb_per_frame']:8.1f} KiB/frame")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+
+    if args.update_baseline or not os.path.exists(args.baseline):
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=4)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,89 @@
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import json
+
+import pygame
+
+import Game
+
+ATLAS_WIDTH = 2048
+PADDING = 1
+
+def atlas_images(game_config):
+    manifest = Game.asset_manifest(game_config)
+    sprites = set(manifest["explore"]) - set(manifest["world"])
+    # The manifest leaves out corpus portraits, which the game loads when a conversation opens.
+    if os.path.isdir(Game.DIALOG_SOURCE_DIR):
+        for dialogs in Game.load_dialog_sources(Game.DIALOG_SOURCE_DIR).values():
+            manifest["dialog"] += Game.dialog_portraits(dialogs)
+    images = []
+    for group in manifest.values():
+        for filename, width, height, color in group:
+            surface, loaded = Game.load_image(filename, width, height, color)
+            if not loaded:
+                # Missing files stay runtime placeholders; their color depends on the caller.
+                continue
+            angles = Game.WALK_ANGLES if (filename, width, height, color) in sprites else (0,)
+            mtime = os.path.getmtime(os.path.join('images', filename))
+            for angle in angles:
+                frame = surface if angle == 0 else pygame.transform.rotate(surface, angle)
+                images.append(((filename, width, height, angle), frame, mtime))
+    return list({key: (key, frame, mtime) for key, frame, mtime in images}.values())
+
+def pack(images, atlas_width):
+    # Shelf packing, tallest images first.
+    placements = []
+    x = y = shelf_height = 0
+    for key, frame, mtime in sorted(images, key=lambda image: -image[1].get_height()):
+        width, height = frame.get_size()
+        if width > atlas_width:
+            raise ValueError(f"{key[0]} is wider than the atlas ({width} > {atlas_width})")
+        if x + width > atlas_width:
+            x, y = 0, y + shelf_height + PADDING
+            shelf_height = 0
+        placements.append((key, frame, mtime, pygame.Rect(x, y, width, height)))
+        x += width + PADDING
+        shelf_height = max(shelf_height, height)
+    return placements, y + shelf_height
+
+def is_opaque(surface):
+    # PNGs usually carry an alpha channel even when every pixel is solid, so look at the values.
+    if not surface.get_flags() & pygame.SRCALPHA:
+        return True
+    return min(pygame.image.tobytes(surface, "RGBA")[3::4]) == 255
+
+def build_atlas(path, game_config, atlas_width=ATLAS_WIDTH):
+    placements, atlas_height = pack(atlas_images(game_config), atlas_width)
+    sheet = pygame.Surface((atlas_width, max(1, atlas_height)), pygame.SRCALPHA, 32)
+    entries = []
+    for key, frame, mtime, rect in placements:
+        # MAX against the transparent sheet copies pixels and alpha without blending.
+        sheet.blit(frame, rect, special_flags=pygame.BLEND_RGBA_MAX)
+        opaque = key[3] == 0 and is_opaque(frame)
+        entries.append({"key": list(key), "rect": list(rect), "mtime": mtime, "opaque": opaque})
+
+    header = json.dumps({"width": sheet.get_width(), "height": sheet.get_height(), "entries": entries}).encode("utf-8")
+    start = Game.ATLAS_HEADER.size
+    padding = (start + len(header) + 15) // 16 * 16 - (start + len(header))
+    with open(path, 'wb') as f:
+        f.write(Game.ATLAS_HEADER.pack(Game.ATLAS_MAGIC, Game.ATLAS_VERSION, len(header)))
+        f.write(header)
+        f.write(bytes(padding))
+        f.write(pygame.image.tobytes(sheet, "RGBA"))
+    return len(entries), sheet.get_size()
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack every configured image, pre-scaled and pre-rotated, into one atlas bundle")
+    parser.add_argument("--output", default=Game.PERFORMANCE.get("atlas", "assets.atlas"))
+    parser.add_argument("--width", type=int, default=ATLAS_WIDTH)
+    args = parser.parse_args()
+
+    count, size = build_atlas(args.output, Game.config, args.width)
+    print(f"Packed {count} images into {args.output} ({size[0]}x{size[1]}, {os.path.getsize(args.output) // 1024} KiB)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import argparse
+import json
+
+import Game
+
+def extract_inline_dialogs(game_config):
+    # Inline "dialogs" lists from the config, keyed by character name, ready to move into a source file.
+    characters = game_config["characters"]
+    return {
+        character["name"]: character["dialogs"]
+        for character in characters["enemies"] + characters["npcs"]
+        if character.get("dialogs")
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile dialogs/<language>.json into the indexed dialog corpus")
+    parser.add_argument("--sources", default=Game.DIALOG_SOURCE_DIR)
+    parser.add_argument("--output", default=Game.config["game"].get("dialog_corpus", "dialogs.corpus"))
+    parser.add_argument("--extract", metavar="LANGUAGE",
+                        help=f"first move inline dialogs from {Game.CONFIG_FILE} into <sources>/LANGUAGE.json")
+    args = parser.parse_args()
+
+    if args.extract:
+        path = os.path.join(args.sources, args.extract + ".json")
+        conversations = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding="utf-8") as f:
+                conversations = json.load(f)
+        extracted = extract_inline_dialogs(Game.config)
+        conversations.update(extracted)
+        os.makedirs(args.sources, exist_ok=True)
+        with open(path, 'w', encoding="utf-8") as f:
+            json.dump(conversations, f, indent=4, ensure_ascii=False)
+            f.write("\n")
+        print(f"Extracted {len(extracted)} conversations into {path}; "
+              f"replace their \"dialogs\" lists with \"dialog\": \"<name>\" in {Game.CONFIG_FILE}")
+
+    count = Game.write_dialog_corpus(args.output, Game.load_dialog_sources(args.sources))
+    print(f"Wrote {count} conversations to {args.output} ({os.path.getsize(args.output) // 1024} KiB)")
+
+if __name__ == "__main__":
+    main()
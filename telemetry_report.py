@@ -0,0 +1,38 @@
+import os
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+# Entries go to stdout as JSON lines, so keep pygame's greeting out of them.
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import glob
+import json
+
+import Game
+
+def summarize(paths):
+    events, dropped = {}, 0
+    for path in paths:
+        for entry in Game.read_telemetry(path):
+            events[entry["event"]] = events.get(entry["event"], 0) + 1
+            if entry["event"] == "dropped":
+                dropped += entry["count"]
+    return {"files": len(paths), "events": events, "dropped_records": dropped}
+
+def main():
+    parser = argparse.ArgumentParser(description="Print gameplay telemetry files (either format) as JSON lines")
+    parser.add_argument("paths", nargs="*", help="telemetry files (default: every file in the configured directory)")
+    parser.add_argument("--summary", action="store_true", help="count events and dropped records instead")
+    args = parser.parse_args()
+
+    paths = args.paths or sorted(glob.glob(os.path.join(Game.TELEMETRY.get("directory", "telemetry"), "telemetry-*.gz")))
+    if args.summary:
+        print(json.dumps(summarize(paths), indent=4))
+        return
+    for path in paths:
+        for entry in Game.read_telemetry(path):
+            print(json.dumps(entry))
+
+if __name__ == "__main__":
+    main()